@@ -0,0 +1,244 @@
+# $LAN=PYTHON$
+
+# Voronoi Diagram benchmark
+# Python 3.9.5
+
+'''
+Run the divide-and-conquer solver headless on generated point sets and report,
+for every distribution and size, the wall time of compute(), its peak memory and how often it fails.
+
+    python benchmark.py                                   # every distribution, 10 to 10**6 sites
+    python benchmark.py --sizes 10 1000 --distributions uniform grid --repeats 5
+    python benchmark.py --sizes 100000 --processes 1 2 4            # compute(processes=...) for each
+    python benchmark.py --save-baseline baseline.json     # record the results
+    python benchmark.py --baseline baseline.json          # compare with them, exit 1 on a regression
+    python benchmark.py --lloyd 20000 --lloyd-iterations 10  # lloyd() against a compute() per iteration
+
+Every run is in a new process, so that a crash or a timeout is counted as a failure
+and the peak memory is that of the run alone, without its worker processes when processes > 1.
+A run also fails if a sampled edge is not on the bisector of its two sites,
+or if another site is nearer to it than they are.
+'''
+
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import voronoi
+
+DISTRIBUTIONS = ('uniform', 'clustered', 'collinear', 'grid', 'duplicates')
+SIZES = (10, 100, 1000, 10**4, 10**5, 10**6)
+# compute(processes=...) of every size, the pool is only used from 2*voronoi.PARALLEL_MIN_SITES sites
+PROCESSES = (1, 4)
+
+# Edges checked in every result
+CHECKED_EDGES = 100
+# Relative error allowed in the distances of the checked edges
+TOLERANCE = 1e-7
+
+
+def generate(distribution: str, n: int, seed: int) -> np.ndarray:
+    '''
+    [n, 2] int64 points.  The coordinates grow with n so that a uniform set has few duplicates,
+    except for 'duplicates', where about 30% of the points repeat others.
+    '''
+    rng = np.random.default_rng(seed)
+    size = max(600, int(np.sqrt(n))*32)
+    if distribution == 'uniform':
+        return rng.integers(0, size, [n, 2])
+    if distribution == 'clustered':
+        nClusters = max(1, n//1000)
+        centers = rng.integers(0, size, [nClusters, 2])
+        spread = size/(8*np.sqrt(nClusters))
+        points = centers[rng.integers(0, nClusters, n)] + rng.normal(0, spread, [n, 2])
+        return np.round(points).astype(np.int64)
+    if distribution == 'collinear':
+        direction = rng.integers(1, 8, 2)
+        steps = rng.permutation(4*n)[:n]
+        return rng.integers(0, size, 2) + steps[:, None]*direction
+    if distribution == 'grid':
+        side = int(np.ceil(np.sqrt(n)))
+        return np.stack([np.arange(n) % side, np.arange(n)//side], 1)*10
+    if distribution == 'duplicates':
+        unique = rng.integers(0, size, [n - n*3//10, 2])
+        points = np.vstack([unique, unique[rng.integers(0, len(unique), n*3//10)]])
+        return points[rng.permutation(n)]
+    raise ValueError(f'Unknown distribution {distribution}')
+
+
+def check(v: voronoi.CompactVoronoi, seed: int) -> bool:
+    ''' Are some sampled edges on the bisector of their sites, with no other site nearer '''
+    if len(v.edgeVertices) == 0:
+        return True
+    rng = np.random.default_rng(seed)
+    edges = rng.choice(len(v.edgeVertices), min(CHECKED_EDGES, len(v.edgeVertices)), replace=False)
+    sites = v.sites.astype(np.float64)
+    middles = v.vertices[v.edgeVertices[edges]].mean(1)
+    left, right = (np.hypot(*(middles - sites[v.edgeSites[edges, i]]).T) for i in range(2))
+    tolerance = TOLERANCE*np.maximum(left, 1)
+    if np.any(np.abs(left - right) > tolerance):
+        return False
+    for middle, distance, error in zip(middles, left, tolerance):
+        if np.hypot(*(sites - middle).T).min() < distance - error:
+            return False
+    return True
+
+
+def run(distribution: str, n: int, seed: int, processes: int, connection):
+    ''' In a child process: send (seconds, peak MB, digest of the save() text, check() passed) '''
+    points = generate(distribution, n, seed)
+    memoryBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    v = voronoi.compute(points, processes=processes)
+    seconds = time.perf_counter() - start
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoryBefore)/1024
+    f = io.StringIO()
+    v.write(f)
+    digest = hashlib.sha1(f.getvalue().encode()).hexdigest()
+    connection.send((seconds, peak, digest, check(v.compact(), seed)))
+
+
+def measure(distribution: str, n: int, seed: int, processes: int, timeout: float) -> dict:
+    ''' run() in a new process, a crash, a timeout or a failed check() is a failure '''
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=run, args=(distribution, n, seed, processes, sender))
+    process.start()
+    sender.close()
+    result = {'distribution': distribution, 'size': n, 'processes': processes, 'seed': seed}
+    if receiver.poll(timeout):
+        try:
+            seconds, peak, digest, isValid = receiver.recv()
+            result.update(seconds=seconds, peakMB=peak, digest=digest, failed=not isValid)
+        except EOFError:
+            result.update(failed=True, error='crashed')
+    else:
+        result.update(failed=True, error='timeout' if process.is_alive() else 'crashed')
+    process.kill()
+    process.join()
+    return result
+
+
+def lloydSeconds(n: int, iterations: int, seed: int) -> Tuple[float, float]:
+    '''
+    (seconds of voronoi.lloyd(), seconds of the same iterations with a compute() each)
+    on 'uniform' points, every iteration is done: the tolerance is 0
+    '''
+    points = generate('uniform', n, seed)
+    bounds = voronoi.paddedBounds(points)
+    start = time.perf_counter()
+    voronoi.lloyd(points, bounds, tolerance=0, maxIterations=iterations)
+    warm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sites = points
+    for _ in range(iterations):
+        v = voronoi.compute(sites, compact=True)
+        _, centroids, _ = v.cellMeasures(bounds)
+        sites = np.where(np.isnan(centroids), v.sites, centroids)
+    return warm, time.perf_counter() - start
+
+
+def summarize(results: List[dict]) -> List[str]:
+    ''' A line per distribution and size '''
+    lines = [f'{"distribution":<12} {"size":>8} {"procs":>5} {"runs":>5} {"failed":>7} '
+             f'{"median s":>10} {"min s":>10} {"peak MB":>8}']
+    groups: Dict[tuple, List[dict]] = {}
+    for r in results:
+        groups.setdefault((r['distribution'], r['size'], r['processes']), []).append(r)
+    for (distribution, n, processes), runs in groups.items():
+        seconds = [r['seconds'] for r in runs if 'seconds' in r]
+        peaks = [r['peakMB'] for r in runs if 'peakMB' in r]
+        failed = sum(r['failed'] for r in runs)
+        lines.append(f'{distribution:<12} {n:>8} {processes:>5} {len(runs):>5} {failed/len(runs):>7.0%} ' +
+                     (f'{np.median(seconds):>10.4f} {min(seconds):>10.4f} {max(peaks):>8.1f}'
+                      if seconds else f'{"-":>10} {"-":>10} {"-":>8}'))
+    return lines
+
+
+def compare(results: List[dict], baseline: List[dict], maxSlowdown: float) -> List[str]:
+    '''
+    Regressions against 'baseline': a run that fails now, a different result,
+    or a median time of a distribution and size over 'maxSlowdown' times the baseline one.
+    '''
+    regressions = []
+    # A baseline from before --processes took several values ran with 1
+    before = {(r['distribution'], r['size'], r.get('processes', 1), r['seed']): r for r in baseline}
+    times: Dict[tuple, tuple] = {}
+    for r in results:
+        key = (r['distribution'], r['size'], r['processes'], r['seed'])
+        old = before.get(key)
+        if old is None:
+            continue
+        name = f'{r["distribution"]} n={r["size"]} processes={r["processes"]} seed={r["seed"]}'
+        if r['failed'] and not old['failed']:
+            regressions.append(f'{name}: fails ({r.get("error", "wrong result")})')
+        elif 'digest' in r and 'digest' in old and r['digest'] != old['digest']:
+            regressions.append(f'{name}: the result changed')
+        if 'seconds' in r and 'seconds' in old:
+            now, then = times.setdefault(key[:3], ([], []))
+            now.append(r['seconds'])
+            then.append(old['seconds'])
+    for (distribution, n, processes), (now, then) in times.items():
+        slowdown = np.median(now)/np.median(then)
+        if slowdown > maxSlowdown:
+            regressions.append(f'{distribution} n={n} processes={processes}: {slowdown:.2f}x slower')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark voronoi.compute()')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument('--repeats', type=int, default=3, help='runs with different seeds per size')
+    parser.add_argument('--processes', type=int, nargs='+', default=PROCESSES,
+                        help='passed to compute(), every size is run with each')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds before a run fails')
+    parser.add_argument('--save-baseline', metavar='JSON', help='write every run to this file')
+    parser.add_argument('--baseline', metavar='JSON', help='compare with a --save-baseline file')
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help='median time ratio to the baseline counted as a regression')
+    parser.add_argument('--lloyd', type=int, metavar='N',
+                        help='only time lloyd() on N uniform sites against a compute() per iteration')
+    parser.add_argument('--lloyd-iterations', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.lloyd is not None:
+        warm, cold = lloydSeconds(args.lloyd, args.lloyd_iterations, 0)
+        print(f'lloyd n={args.lloyd}, {args.lloyd_iterations} iterations: {warm:.2f} s, '
+              f'with a compute() per iteration {cold:.2f} s ({cold/warm:.1f}x)')
+        return 0
+
+    results = []
+    for distribution in args.distributions:
+        for n in args.sizes:
+            for processes in args.processes:
+                for seed in range(args.repeats):
+                    results.append(measure(distribution, n, seed, processes, args.timeout))
+                    print(f'\r{distribution} n={n} processes={processes} seed={seed}', end='',
+                          file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    print('\n'.join(summarize(results)))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_slowdown)
+        print(f'\n{len(regressions)} regressions')
+        for line in regressions:
+            print(line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
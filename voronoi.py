@@ -7,28 +7,35 @@
 # M103040005 TU CHIA HAO
 
 
-import sys
-from typing import List, Optional, Tuple, Union
-from PyQt5.QtWidgets import *
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
+from typing import Iterator, List, Optional, Tuple, Union
 import numpy as np
-from functools import cmp_to_key
-from math import ceil, floor, sqrt
-import traceback
+import io
+import os
+import sys
+import time
+import multiprocessing
+from collections import deque
+from itertools import islice
+from functools import partial
+from bisect import bisect_left
+from fractions import Fraction
+from math import ceil, inf, lcm, sqrt
 
 WIN_SIZE = 600
 DEBUG = False
 
-GRAY = QColor('#777')
-RED = QColor('#f54242')
-LIGHT_GREEN = QColor('#c0eb34')
-GREEN = QColor('#00cf0a')
-BLUE = QColor('#007bff')
-PURPLE = QColor('#b434eb')
+# Binary result files, see CompactVoronoi.save()
+BINARY_EXT = '.vd'
+BINARY_MAGIC = b'VORONOI1'
+
+# compute(processes=...) only sends sub-diagrams of at least this many sites to other processes
+PARALLEL_MIN_SITES = 2000
 
 
 class Point:
+    # No __dict__ for the millions of Points, Vertices and Edges of a big diagram
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y) -> None:
         self.x = x
         self.y = y
@@ -45,9 +52,6 @@ class Point:
     def __lt__(self, p):
         return self.x < p.x or (self.x == p.x and self.y > p.y)
 
-    def lessThan_yFirst(self, p):
-        return self.y < p.y or (self.y == p.y and self.x < p.x)
-
     def __add__(self, other):
         return Point(self.x + other.x, self.y + other.y)
 
@@ -96,7 +100,10 @@ class Voronoi:
             self.isInfinite = isInfinite
 
 
-PRECISION = .0000001
+# Error bound of the float ccwXY(), from Shewchuk's "Adaptive Precision Floating-Point Arithmetic
+# and Fast Robust Geometric Predicates"
+EPSILON = 2**-53
+CCW_ERROR_BOUND = (3 + 16*EPSILON)*EPSILON
 
 
 class Voronoi:
@@ -110,6 +117,9 @@ class Voronoi:
         cwSuccessor: Voronoi.Edge
         ccwSuccessor: Voronoi.Edge
 
+        __slots__ = ('rightPolygon', 'leftPolygon', 'startVertex', 'endVertex', 'cwPredecessor',
+                     'ccwPredecessor', 'cwSuccessor', 'ccwSuccessor')
+
         def __init__(self) -> None:
             self.rightPolygon = None
             self.leftPolygon = None
@@ -119,7 +129,6 @@ class Voronoi:
             self.ccwPredecessor = None
             self.cwSuccessor = None
             self.ccwSuccessor = None
-            self.intersected = False
 
         def __repr__(self):
             return self.__str__()
@@ -127,1207 +136,2274 @@ class Voronoi:
         def __str__(self):
             return f'{self.startVertex} -> {self.endVertex}'
 
-        class Intersection(Point):
-            def __init__(self, x, y, edgeP: Voronoi.Edge, edgeQ: Voronoi.Edge, r: Point, s: Point, rs, t, u) -> None:
-                super().__init__(x, y)
-                self.edgeP = edgeP
-                self.edgeQ = edgeQ
-                self.r = r
-                self.s = s
-                self.rs = rs
-                self.t = t
-                self.u = u
-                # edgeQ is from the left diagram (at the merging step)
-                self.isLeft = edgeQ.leftPolygon.isLeft
-
-            @property
-            def p(self):
-                return self.edgeP
-
-            @property
-            def q(self):
-                return self.edgeQ
-
-        def intersection(self, e):
-            '''
-            return self if collinear
-            return None if no intersection
-            return the intersection as a Point
+        def attach(self):
+            ''' Register self as an edge of both its Polygons '''
+            self.leftPolygon.incidentEdges.append(self)
+            self.rightPolygon.incidentEdges.append(self)
 
-            https://stackoverflow.com/questions/563198/how-do-you-detect-where-two-line-segments-intersect
-            '''
-            e: Voronoi.Edge
-
-            p: Point = self.startVertex
-            q: Point = e.startVertex
-            r: Point = self.endVertex-self.startVertex
-            s: Point = e.endVertex-e.startVertex
-
-            pq: Point = q-p
-            pqs: float = pq * s
-            rs: float = (r * s)
-            if rs == 0:  # parallel
-                if pqs == 0:  # collinear
-                    return self
-                else:  # parallel but not the same line
-                    return None
-            else:  # not parallel
-                t: float = pqs / rs
-                u: float = pq * r / rs
-                intersection = p+t*r
-                intersection = Voronoi.Edge.Intersection(
-                    intersection.x, intersection.y, self, e, r, s, rs, t, u)
-
-                # def checkU_exclude():
-                #     if u <= 0+PRECISION:
-                #         if e.startVertex.isInfinite:
-                #             return intersection
-                #         return None
-                #     if u < 1-PRECISION:
-                #         return intersection
-                #     if e.endVertex.isInfinite:
-                #         return intersection
-                #     return None
-                def checkU():
-                    if u < 0-PRECISION:
-                        if e.startVertex.isInfinite:
-                            return intersection
-                        return None
-                    if u <= 1+PRECISION:
-                        return intersection
-                    if e.endVertex.isInfinite:
-                        return intersection
-                    return None
-                if t < 0-PRECISION:
-                    if self.startVertex.isInfinite:
-                        return checkU()
-                    return None
-                if t <= 1+PRECISION:
-                    return checkU()
-                if self.endVertex.isInfinite:
-                    return checkU()
-                return None
+        def detach(self):
+            ''' Unregister self from both its Polygons '''
+            self.leftPolygon.incidentEdges.remove(self)
+            self.rightPolygon.incidentEdges.remove(self)
 
     class Polygon(Point):
+        __slots__ = ('edge', 'incidentEdges', 'exactX', 'exactY')
+
         def __init__(self, x, y) -> None:
             super().__init__(x, y)
             self.edge = None
 
-            # is in the left convex hull during merge
-            self.isLeft = False
-
-        # def edges(self) -> List[Voronoi.Edge]:
-        #     e: Voronoi.Edge = self.edge
-        #     result = []
-        #     if e is None:
-        #         return result
-
-        #     # ccw
-        #     while True:
-        #         # print('.',end='',flush=True)
-        #         result.append(e)
-        #         if e.leftPolygon is self:
-        #             e = e.cwSuccessor
-        #         else:
-        #             e = e.cwPredecessor
-        #         if e is None or e is self.edge:
-        #             break
-
-        #     e: Voronoi.Edge = self.edge
-        #     # cw
-        #     while True:
-        #         # print('.',end='',flush=True)
-        #         if e.leftPolygon is self:
-        #             e = e.ccwPredecessor
-        #         else:
-        #             e = e.ccwSuccessor
-        #         if e is None or e is self.edge:
-        #             break
-        #         result.append(e)
-
-        #     return result
-
-        def edges(self, v: Voronoi) -> List[Voronoi.Edge]:
-            result = []
-            for e in v.edges:
-                if e.rightPolygon is self or e.leftPolygon is self:
-                    result.append(e)
-            return result
+            # Integer coordinates for the exact predicates, see setExactCoordinates()
+            self.exactX = x if type(x) is int else None
+            self.exactY = y if type(y) is int else None
+
+            # Edges between self and its neighbors.
+            # Kept up to date by the merge, so it is never scanned out of the whole diagram.
+            self.incidentEdges: List[Voronoi.Edge] = []
+
+        def edges(self) -> List[Voronoi.Edge]:
+            '''
+            O(degree).  The returned list is the live index, do not modify it.
+
+            During the merge, HP is not attached yet,
+            so only the edges of the half diagram self belongs to are returned.
+            '''
+            return self.incidentEdges
 
     class Vertex(Point):
+        '''
+        A finite Vertex is shared by all the edges meeting at it,
+        an infinite one belongs to its edge only and may be moved.
+        '''
+        __slots__ = ('edge', 'isInfinite', 'exact')
+
         def __init__(self, x, y, edge, isInfinite=False) -> None:
             super().__init__(x, y)
             self.edge = edge
             self.isInfinite = isInfinite
+            # (X, Y, D): the vertex is at (X/D, Y/D) on the scale of exactX, exactY, see mergeVoronoi()
+            self.exact = None
 
-    def __init__(self, P: List[Voronoi.Polygon], edges: List[Voronoi.Edge] = []) -> None:
+    def __init__(self, P: List[Voronoi.Polygon], edges: Optional[List[Voronoi.Edge]] = None,
+                 hull: Optional[List[Voronoi.Polygon]] = None) -> None:
         # self.P = [Voronoi.Polygon(x, y) for x, y in P]
         self.P = P
-        self.edges = edges
+        self.edges = [] if edges is None else edges
 
-    def save(self, fname):
-        with open(fname, 'w') as f:
-            def cmp1(p1: Point, p2: Point):
-                a = p1.x-p2.x
-                if a != 0:
-                    return a
-                return p1.y-p2.y
-            self.P.sort(key=cmp_to_key(cmp1))
-
-            def cmp2(e1: Voronoi.Edge, e2: Voronoi.Edge):
-                e1 = e1.startVertex, e1.endVertex
-                e2 = e2.startVertex, e2.endVertex
-                if cmp1(e1[1], e1[0]) < 0:
-                    e1 = e1[1], e1[0]
-                if cmp1(e2[1], e2[0]) < 0:
-                    e2 = e2[1], e2[0]
-                a = e1[0].x-e2[0].x
-                if a != 0:
-                    return a
-                a = e1[0].y-e2[0].y
-                if a != 0:
-                    return a
-                return e1[1].y-e2[1].y
-            self.edges.sort(key=cmp_to_key(cmp2))
-
-            # write
-            for p in self.P:
-                f.write(f'P {p}\n')
-            for e in self.edges:
-                e = e.startVertex, e.endVertex
-                if cmp1(e[1], e[0]) < 0:
-                    e = e[1], e[0]
-                f.write(f'E {e[0]} {e[1]}\n')
-
-
-class Canvas(QLabel):
-    STEP_MS = 200
-
-    def __init__(self):
-        super().__init__()
-        self.polygons = []
-
-        self.mutex = QMutex()
-        self.waitCondition = QWaitCondition()
-        self.stepByStep = True
-        self.continueUntilHP = False
-        self.stepMs = Canvas.STEP_MS
-
-        self.setMinimumSize(WIN_SIZE, WIN_SIZE)
-        self.curX = self.curY = None
-        self.ctrl = False
-
-        self.last_x, self.last_y = None, None
-        self.pen_color = GRAY
-        self.setAttribute(Qt.WA_TranslucentBackground)
-        self.setAlignment(Qt.AlignTop)
-
-        if len(sys.argv) > 1:
-            self.setMode(self.Mode.FreeDraw)
-        else:
-            self.setMode(self.Mode.AddPoint)
-
-        # Allow resize smaller than content pixmap
-        sizePolicy = self.sizePolicy()
-        sizePolicy.setVerticalPolicy(QSizePolicy.Ignored)
-        sizePolicy.setHorizontalPolicy(QSizePolicy.Ignored)
-        self.setSizePolicy(sizePolicy)
-
-        # setFocus to receive keypress
-        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
-        self.setFocus()
-
-        # Thread --------------------------------------------------------
-        self.workerThread = WorkerThread(self)
-        self.workerThread.canvasUpdate.connect(self.canvasUpdate)
-        self.workerThread.clearCanvas.connect(self.clearCanvas)
-        self.workerThread.drawPoints.connect(self.drawPoints)
-        self.workerThread.drawPolygon.connect(self.drawPolygon)
-        self.workerThread.drawVoronoiOrEdges.connect(self.drawVoronoiOrEdges)
-        self.workerThread.drawEdge.connect(self.drawEdge)
-        self.workerThread.start()
-
-    def waitNext(self):
-        # if self.stepByStep:
-        # self.update()
-        self.workerThread.canvasUpdate.emit()
-        self.stepByStep = True
-        self.continueUntilHP = False
-        self.stepMs = Canvas.STEP_MS
-        self.mutex.lock()
-        self.waitCondition.wait(self.mutex)
-        self.mutex.unlock()
-
-    def waitStep(self, stepMs=None):
-        # self.update()
-        self.workerThread.canvasUpdate.emit()
-        if self.stepByStep:
-            self.mutex.lock()
-            self.waitCondition.wait(self.mutex)
-            self.mutex.unlock()
-        elif self.stepMs > 0:
-            if stepMs is None:
-                stepMs = self.stepMs
-            self.mutex.lock()
-            self.waitCondition.wait(self.mutex, stepMs)
-            self.mutex.unlock()
-
-    def waitHP(self):
-        if self.continueUntilHP:
-            self.workerThread.canvasUpdate.emit()
-            self.continueUntilHP = False
-            self.stepByStep = True
-            self.mutex.lock()
-            self.waitCondition.wait(self.mutex)
-            self.mutex.unlock()
-        else:
-            self.waitStep()
+        # Convex hull vertices sorted by Point.__lt__, made at the top of the merge
+        self.hull = hull
 
-    def wakePlayCondition(self):
-        self.waitCondition.wakeOne()
+        # (lower, upper) chains of the convex hull as indices of the sites below the top of the merge,
+        # see mergeConvexHulls()
+        self.hullChains = None
 
-    def canvasUpdate(self):
-        self.update()
+        # The scale of exactX, exactY, see setExactCoordinates().  None if not set up yet
+        self.scale = None
 
-    def clearCanvas(self):
-        # pixmap = QPixmap(self.width(), self.height())
-        # pixmap.fill(Qt.GlobalColor.transparent)
-        # self.setPixmap(pixmap)
+        # (xMin, yMin, xMax, yMax) where the infinite ends are, see placeInfiniteEnds().  None if not set up yet
+        self.bounds = None
 
-        self.pixmap().fill(Qt.GlobalColor.transparent)
+        # id() -> index in P / edges, built on the first insert() or remove()
+        self.siteIndex = None
+        self.edgeIndex = None
 
-        # painter = QPainter(self.pixmap())
-        # painter.setCompositionMode(QPainter.CompositionMode_Source)
-        # painter.fillRect(self.rect(), Qt.GlobalColor.transparent)
-        # painter.end()
+        # Bumped once every insert() and remove() is done, so that a cache of the drawn geometry can tell it is stale
+        self.version = 0
 
-    def resizeEvent(self, event):
-        if self.pixmap() is None:
-            pixmap = QPixmap(self.width(), self.height())
-            pixmap.fill(Qt.GlobalColor.transparent)
-            self.setPixmap(pixmap)
-            return
-        
-        pixmap = QPixmap(self.width(), self.height())
-        pixmap.fill(Qt.GlobalColor.transparent)
-        painter=QPainter(pixmap)
-        painter.drawPixmap(0,self.height()-self.pixmap().height(),self.pixmap())
-        painter.end()
-        self.setPixmap(pixmap)
-
-    class Mode:
-        FreeDraw = 0
-        InsertCircle = 1
-        InsertRectangle = 2
-        Crop = 3
-        AddPoint = 4
-
-    def setMode(self, mode):
-        self.mode = mode
-
-    def set_pen_color(self, c):
-        self.pen_color = QColor(c)
-
-    def drawPoints(self, points: List[Point], qcolor=GRAY):
-        painter = QPainter(self.pixmap())
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-        # # square point
-        # p = painter.pen()
-        # p.setWidth(10)
-        # p.setColor(qcolor)
-        # painter.setPen(p)
-        # for p in points:
-        #     painter.drawPoint(QPointF(p.x, self.height()-p.y))
-
-        RADIUS = 4
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(QBrush(qcolor))
-        for p in points:
-            # painter.drawPoint(QPointF(p.x, self.height()-p.y))
-            painter.drawEllipse(
-                QPointF(p.x, self.height()-p.y), RADIUS, RADIUS)
-
-        painter.end()
-        # self.update()
-
-    def drawPolygon(self, points, qcolor):
-        painter = QPainter(self.pixmap())
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        p = painter.pen()
-        p.setWidth(4)
-        p.setColor(qcolor)
-        painter.setPen(p)
-        polygon = QPolygonF([QPointF(p.x, self.height()-p.y) for p in points])
-        painter.drawPolygon(polygon)
-        p.setWidth(10)
-        painter.setPen(p)
-        painter.drawPoints(polygon)
-        painter.end()
-        # if update:
-        #     self.update()
-
-    def drawEdge(self, edge: list, qcolor, width, penStyle: Qt.PenStyle):
-        painter = QPainter(self.pixmap())
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        p = painter.pen()
-        p.setWidth(width)
-        p.setColor(qcolor)
-        p.setStyle(penStyle)
-        painter.setPen(p)
-        painter.drawLine(QPointF(edge[0].x, self.height()-edge[0].y),
-                         QPointF(edge[1].x, self.height()-edge[1].y))
-        painter.end()
-        # self.update()
-
-    def drawVoronoiOrEdges(self, voronoi: Union[Voronoi, list], qcolor, width):
-        edges = voronoi
-        if isinstance(voronoi, Voronoi):
-            edges = voronoi.edges
-            self.drawPoints(voronoi.P, qcolor)
-
-        painter = QPainter(self.pixmap())
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        p = painter.pen()
-        p.setWidth(width)
-        p.setColor(qcolor)
-        painter.setPen(p)
-        for e in edges:
-            e: Voronoi.Edge
-            painter.drawLine(QPointF(e.startVertex.x, self.height()-e.startVertex.y), QPointF(
-                e.endVertex.x, self.height()-e.endVertex.y))
-        painter.end()
-        # self.update()
-
-    def mUpdate(self, x, y):
-        if self.last_x is None:  # First event.
-            if self.mode != self.Mode.FreeDraw and self.mode != self.Mode.FreeDraw != self.Mode.AddPoint:
-                self.startPixmap = self.pixmap().copy()
-            self.last_x = x
-            self.last_y = y
-            return  # Ignore the first time.
-
-        # modifiers = QApplication.keyboardModifiers() # untrustable.  Use keyPressEvent instead
-        if self.mode == self.Mode.FreeDraw:
-            painter = QPainter(self.pixmap())
-            p = painter.pen()
-            p.setWidth(4)
-            p.setColor(self.pen_color)
-            painter.setPen(p)
-            painter.drawLine(self.last_x, self.last_y, x, y)
-            painter.end()
-            self.update()
-
-            # Update the origin for next time.
-            self.last_x = x
-            self.last_y = y
-        elif self.mode == self.Mode.InsertCircle:
-            pixmap = self.startPixmap.copy()
-            painter = QPainter(pixmap)
-            p = painter.pen()
-            p.setWidth(4)
-            p.setColor(self.pen_color)
-            painter.setPen(p)
-
-            if self.ctrl:
-                painter.drawEllipse(
-                    QPoint(self.last_x, self.last_y), x-self.last_x, y-self.last_y)
-            else:
-                painter.drawEllipse(self.last_x, self.last_y,
-                                    x-self.last_x, y-self.last_y)
-
-            painter.end()
-            self.setPixmap(pixmap)
-        elif self.mode == self.Mode.InsertRectangle:
-            pixmap = self.startPixmap.copy()
-            painter = QPainter(pixmap)
-            p = painter.pen()
-            p.setWidth(4)
-            p.setColor(self.pen_color)
-            painter.setPen(p)
-
-            if self.ctrl:
-                painter.drawRect(2*self.last_x-x, 2*self.last_y-y,
-                                 (x-self.last_x)*2, (y-self.last_y)*2)
-            else:
-                painter.drawRect(self.last_x, self.last_y,
-                                 x-self.last_x, y-self.last_y)
-
-            painter.end()
-            self.setPixmap(pixmap)
-        elif self.mode == self.Mode.Crop:
-            pixmap = self.startPixmap.copy()
-            painter = QPainter(pixmap)
-            # p = painter.pen()
-            # p.setWidth(4)
-            # p.setColor(Qt.GlobalColor.transparent)
-            # painter.setPen(p)
-            painter.setCompositionMode(QPainter.CompositionMode_Source)
-            painter.fillRect(self.last_x, self.last_y, x -
-                             self.last_x, y-self.last_y, QColor(0, 0, 0, 0))
-            # painter.setCompositionMode (QPainter::CompositionMode_SourceOver);
-
-            painter.end()
-            self.setPixmap(pixmap)
-
-    def keyPressEvent(self, event: QKeyEvent):
-        # modifiers = QApplication.keyboardModifiers() # untrustable.  Use keyPressEvent instead
-        if event.key() == Qt.Key.Key_Enter or event.key() == Qt.Key.Key_Return:
-            self.wakePlayCondition()
-            self.stepByStep = True
-            self.continueUntilHP = False
-            self.stepMs = Canvas.STEP_MS
-        elif event.key() == Qt.Key.Key_H:
-            self.stepMs = 0
-            self.stepByStep = False
-            self.continueUntilHP = True
-            self.wakePlayCondition()
-        elif event.key() == Qt.Key.Key_N:
-            if self.stepByStep:
-                self.stepMs = Canvas.STEP_MS
-                self.stepByStep = False
-                self.continueUntilHP = False
-            else:
-                self.stepMs = int(0.5 * self.stepMs)+1
-            self.wakePlayCondition()
-        elif event.key() == Qt.Key.Key_M:
-            self.stepByStep = False
-            self.continueUntilHP = False
-            self.stepMs = 0
-            self.wakePlayCondition()
-        elif event.key() == Qt.Key.Key_Backspace:
-            if self.mode == self.Mode.AddPoint:
-                if len(self.polygons) > 0:
-                    self.polygons.pop()
-                    self.clearCanvas()
-                    self.drawPoints(self.polygons)
-                    self.update()
-        elif event.key() == Qt.Key.Key_0:
-            if self.mode == self.Mode.AddPoint:
-                self.polygons = []
-                self.clearCanvas()
-                self.update()
-        elif event.key() == Qt.Key.Key_S:
-            if event.modifiers() & Qt.Modifier.CTRL:
-                if self.workerThread.voronoiResult is None:
-                    print('Nothing to save.')
-                else:
-                    fname, _ = QFileDialog.getSaveFileName(
-                        self, 'Save File', '1.txt', 'Text files (*.txt);;XML files (*.xml)')
-                    if fname != '':
-                        self.workerThread.voronoiResult.save(fname)
-        elif event.key() == Qt.Key_Control:
-            self.ctrl = True
-        if self.curX is not None and self.last_x is not None:
-            self.mUpdate(self.curX, self.curY)
-
-    def keyReleaseEvent(self, event):
-        if event.key() == Qt.Key_Control:
-            self.ctrl = False
-        if self.curX is not None and self.last_x is not None:
-            self.mUpdate(self.curX, self.curY)
-
-    def addPoint(self, x, y, computeImmediatly=True):
-        self.polygons.append(Voronoi.Polygon(x, y))
-        if computeImmediatly:
-            self.stepByStep = False
-            self.continueUntilHP = False
-            self.stepMs = 0
-            self.wakePlayCondition()
-        else:
-            self.clearCanvas()
-            self.drawPoints(self.polygons)
-            self.update()
+    def compact(self) -> 'CompactVoronoi':
+        return CompactVoronoi.fromVoronoi(self)
+
+    def delaunay(self) -> Tuple[np.ndarray, np.ndarray]:
+        ''' See CompactVoronoi.delaunay() '''
+        return self.compact().delaunay()
+
+    def cells(self, bounds: Optional[Tuple[float, float, float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        ''' See CompactVoronoi.cells() '''
+        return self.compact().cells(bounds)
+
+    def cellMeasures(self, bounds: Optional[Tuple[float, float, float, float]] = None) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ''' See CompactVoronoi.cellMeasures() '''
+        return self.compact().cellMeasures(bounds)
+
+    def insert(self, site) -> Voronoi.Polygon:
+        '''
+        Add 'site' (a Point, a Polygon or an (x, y) pair), only the cells around it are repaired.
+
+        return the Polygon of the site, an existing one if the site is a duplicate
+        '''
+        try:
+            return insertSite(self, site)
+        finally:
+            # Only once the diagram is done changing, so nothing is cached under the new version before
+            self.version += 1
 
-    def mousePressEvent(self, e):
-        if self.mode == self.Mode.AddPoint:
-            self.addPoint(e.x(), self.height()-e.y())
+    def remove(self, site) -> Voronoi.Polygon:
+        '''
+        Remove 'site' (the Polygon itself, or its coordinates), its neighbors share its cell.
 
-    def mouseMoveEvent(self, e):
-        if self.mode == self.Mode.AddPoint:
-            if e.modifiers() & Qt.Modifier.CTRL:
-                self.addPoint(e.x(), self.height()-e.y(),
-                              computeImmediatly=False)
-        self.curX = e.x()
-        self.curY = e.y()
-        self.mUpdate(e.x(), e.y())
+        return the removed Polygon, raise ValueError if there is no such site
+        '''
+        try:
+            return removeSite(self, site)
+        finally:
+            self.version += 1
 
-    def mouseReleaseEvent(self, e):
-        self.last_x = None
-        self.last_y = None
+    def addSite(self, p: Voronoi.Polygon):
+        self.P.append(p)
+        if self.siteIndex is not None:
+            self.siteIndex[id(p)] = len(self.P)-1
 
+    def discardSite(self, p: Voronoi.Polygon):
+        ''' O(1), the last site takes the place of 'p' '''
+        self.siteIndex = removeByIndex(self.P, self.siteIndex, p)
 
-COLORS = [
-    # 17 undertones https://lospec.com/palette-list/17undertones
-    '#000000', '#141923', '#414168', '#3a7fa7', '#35e3e3', '#8fd970', '#5ebb49',
-    '#458352', '#dcd37b', '#fffee5', '#ffd035', '#cc9245', '#a15c3e', '#a42f3b',
-    '#f45b7a', '#c24998', '#81588d', '#bcb0c2', '#ffffff',
-]
-
-
-class QPaletteButton(QPushButton):
-
-    def __init__(self, color):
-        super().__init__()
-        self.color = color
+    def addEdge(self, e: Voronoi.Edge):
+        self.edges.append(e)
+        if self.edgeIndex is not None:
+            self.edgeIndex[id(e)] = len(self.edges)-1
 
-        self.setFixedSize(QSize(32, 32))
-        self.setStyleSheet(
-            "background-color: %s; border-style: solid;  border-width:1px;  border-radius:50px;" % color)
-        self.setMask(QRegion(QRect(0, 0, 28, 28), QRegion.Ellipse))
+    def discardEdge(self, e: Voronoi.Edge):
+        ''' O(1), the last edge takes the place of 'e' '''
+        e.detach()
+        self.edgeIndex = removeByIndex(self.edges, self.edgeIndex, e)
 
+    def save(self, fname):
+        ''' Text P/E dump, or the binary CompactVoronoi.save() format if 'fname' ends with BINARY_EXT '''
+        if fname.endswith(BINARY_EXT):
+            self.compact().save(fname)
+            return
+        with open(fname, 'w') as f:
+            self.write(f)
+
+    def write(self, f):
+        ''' Write the result in the save() text format to the text file object 'f' '''
+        # Sites by (x, y), edges by (start.x, start.y, end.y) after making start <= end by (x, y).
+        # lexsort is stable like the list sort it replaces, so ties keep their order in P / edges.
+        sites = np.array([(p.x, p.y) for p in self.P], np.float64).reshape([len(self.P), 2])
+        P = [self.P[i] for i in np.lexsort((sites[:, 1], sites[:, 0])).tolist()]
+
+        ends = np.array([(e.startVertex.x, e.startVertex.y, e.endVertex.x, e.endVertex.y) for e in self.edges],
+                        np.float64).reshape([len(self.edges), 4])
+        swap = (ends[:, 2] < ends[:, 0]) | ((ends[:, 2] == ends[:, 0]) & (ends[:, 3] < ends[:, 1]))
+        startY = np.where(swap, ends[:, 3], ends[:, 1])
+        endY = np.where(swap, ends[:, 1], ends[:, 3])
+        order = np.lexsort((endY, startY, np.minimum(ends[:, 0], ends[:, 2])))
+
+        # write, the original coordinates keep their int / float text.
+        # A finite Vertex is shared by about 3 edges, so its text is made once.
+        f.writelines(f'P {p}\n' for p in P)
+        texts = {}
+        lines = []
+        for e, isSwapped in zip(map(self.edges.__getitem__, order.tolist()), swap[order].tolist()):
+            a, b = (e.endVertex, e.startVertex) if isSwapped else (e.startVertex, e.endVertex)
+            textA = texts.get(id(a))
+            if textA is None:
+                textA = texts[id(a)] = str(a)
+            textB = texts.get(id(b))
+            if textB is None:
+                textB = texts[id(b)] = str(b)
+            lines.append(f'E {textA} {textB}\n')
+        f.writelines(lines)
+
+
+class CompactVoronoi:
+    '''
+    Struct-of-arrays form of a Voronoi: a few NumPy arrays instead of an object per site, vertex and edge.
+
+    sites:            [nSites, 2]     int64 if every coordinate is an int, else float64
+    vertices:         [nVertices, 2]  float64, a finite Vertex shared by several edges is stored once
+    vertexIsInfinite: [nVertices]     bool
+    edgeVertices:     [nEdges, 2]     int32 (startVertex, endVertex)
+    edgeSites:        [nEdges, 2]     int32 (leftPolygon, rightPolygon), -1 if None
+    edgeNeighbors:    [nEdges, 4]     int32 (cwPredecessor, ccwPredecessor, cwSuccessor, ccwSuccessor), -1 if None
+    hull:             [nHull]         int32 convex hull sites sorted by Point.__lt__, None if unknown
+    '''
 
-class MainWindow(QMainWindow):
+    def __init__(self, sites: np.ndarray, vertices: np.ndarray, vertexIsInfinite: np.ndarray,
+                 edgeVertices: np.ndarray, edgeSites: np.ndarray, edgeNeighbors: np.ndarray,
+                 hull: Optional[np.ndarray] = None) -> None:
+        self.sites = sites
+        self.vertices = vertices
+        self.vertexIsInfinite = vertexIsInfinite
+        self.edgeVertices = edgeVertices
+        self.edgeSites = edgeSites
+        self.edgeNeighbors = edgeNeighbors
+        self.hull = hull
+
+    @staticmethod
+    def fromVoronoi(v: Voronoi) -> 'CompactVoronoi':
+        siteIndex = {id(p): i for i, p in enumerate(v.P)}
+        edgeIndex = {id(e): i for i, e in enumerate(v.edges)}
+        vertexIndex = {}
+        vertices = []
+        vertexIsInfinite = []
+
+        def indexOfVertex(vertex: Point):
+            i = vertexIndex.get(id(vertex))
+            if i is None:
+                i = vertexIndex[id(vertex)] = len(vertices)
+                vertices.append((vertex.x, vertex.y))
+                # Edges of a loaded result have plain Points as vertices
+                vertexIsInfinite.append(getattr(vertex, 'isInfinite', False))
+            return i
+
+        edgeVertices = np.empty([len(v.edges), 2], np.int32)
+        edgeSites = np.empty([len(v.edges), 2], np.int32)
+        edgeNeighbors = np.empty([len(v.edges), 4], np.int32)
+        for i, e in enumerate(v.edges):
+            edgeVertices[i] = indexOfVertex(e.startVertex), indexOfVertex(e.endVertex)
+            edgeSites[i] = (siteIndex.get(id(e.leftPolygon), -1),
+                            siteIndex.get(id(e.rightPolygon), -1))
+            # A neighbor may have been deleted from the diagram
+            edgeNeighbors[i] = (edgeIndex.get(id(e.cwPredecessor), -1),
+                                edgeIndex.get(id(e.ccwPredecessor), -1),
+                                edgeIndex.get(id(e.cwSuccessor), -1),
+                                edgeIndex.get(id(e.ccwSuccessor), -1))
+
+        hull = None
+        if v.hull is not None:
+            hull = np.array([siteIndex[id(p)] for p in v.hull], np.int32)
+        return CompactVoronoi(
+            np.array([(p.x, p.y) for p in v.P]).reshape([len(v.P), 2]),
+            np.array(vertices, np.float64).reshape([len(vertices), 2]),
+            np.array(vertexIsInfinite, bool),
+            edgeVertices, edgeSites, edgeNeighbors, hull)
+
+    def toVoronoi(self, P: Optional[List[Voronoi.Polygon]] = None) -> Voronoi:
+        '''
+        Build the object view back, with the incident edge index of every Polygon.
 
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Voronoi")
-        # self.resize(WIN_SIZE, WIN_SIZE)
-        # self.mode = self.Mode.FreeDraw
-
-        # Menu ------------------------------------------------
-
-        menuBar = self.menuBar()
-        # Creating menus using a title
-        # fileMenu = menuBar.addMenu("&File")
-        insertMenu = menuBar.addMenu("&Edit")
-        # helpMenu = menuBar.addMenu("&Help")
-
-        insertFreeDrawAction = QAction("&Free Draw", self)
-        insertFreeDrawAction.triggered.connect(
-            lambda: self.canvas.setMode(Canvas.Mode.FreeDraw))
-        insertMenu.addAction(insertFreeDrawAction)
-
-        insertCircleAction = QAction("&Circle", self)
-        insertCircleAction.triggered.connect(self.insertCircle)
-        insertMenu.addAction(insertCircleAction)
-
-        insertRectAction = QAction("&Rectangle", self)
-        insertRectAction.triggered.connect(self.insertRectangle)
-        insertMenu.addAction(insertRectAction)
-
-        insertCropAction = QAction("&Crop", self)
-        insertCropAction.triggered.connect(
-            lambda: self.canvas.setMode(Canvas.Mode.Crop))
-        insertMenu.addAction(insertCropAction)
-
-        # UI --------------------------------------------------
-
-        self.canvas = Canvas()
-
-        paletteLayout = QHBoxLayout()
-        paletteLayout.addWidget(QWidget(), 1)
-        self.add_palette_buttons(paletteLayout)
-        paletteLayout.addWidget(QWidget(), 1)
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas, 1)
-        layout.addLayout(paletteLayout)
-
-        mainWidget = QWidget()
-        mainWidget.setLayout(layout)
-        self.setCentralWidget(mainWidget)
-
-    # def drawInitPoints(self, points):
-    #     self.canvas.drawInitPoints(points)
-
-    def add_palette_buttons(self, layout):
-        for c in COLORS:
-            b = QPaletteButton(c)
-            b.pressed.connect(lambda c=c: self.canvas.set_pen_color(c))
-            layout.addWidget(b)
-
-    def insertCircle(self, event):
-        # print('insertCircle')
-        self.canvas.setMode(Canvas.Mode.InsertCircle)
-        # self.mode = self.Mode.InsertCircle
+        'P': the Polygons of the sites, in the same order, to be used instead of new ones.
+        '''
+        if P is None:
+            P = [Voronoi.Polygon(x, y) for x, y in self.sites.tolist()]
+        else:
+            for p in P:
+                p.incidentEdges = []
+                p.edge = None
+        vertices = [Voronoi.Vertex(x, y, None, isInfinite)
+                    for (x, y), isInfinite in zip(self.vertices.tolist(), self.vertexIsInfinite.tolist())]
+        edges = [Voronoi.Edge() for _ in range(len(self.edgeVertices))]
+        for e, (iStart, iEnd), (iLeft, iRight), neighbors in zip(
+                edges, self.edgeVertices.tolist(), self.edgeSites.tolist(), self.edgeNeighbors.tolist()):
+            e.startVertex = vertices[iStart]
+            e.endVertex = vertices[iEnd]
+            for vertex in (e.startVertex, e.endVertex):
+                if vertex.edge is None:
+                    vertex.edge = e
+            e.cwPredecessor, e.ccwPredecessor, e.cwSuccessor, e.ccwSuccessor = \
+                [edges[i] if i >= 0 else None for i in neighbors]
+            if iLeft >= 0 and iRight >= 0:
+                e.leftPolygon = P[iLeft]
+                e.rightPolygon = P[iRight]
+                for p in (e.leftPolygon, e.rightPolygon):
+                    if p.edge is None:
+                        p.edge = e
+                e.attach()
+
+        hull = None
+        if self.hull is not None:
+            hull = [P[i] for i in self.hull.tolist()]
+        return Voronoi(P, edges, hull)
+
+    def edgeCoordinates(self) -> np.ndarray:
+        ''' [nEdges, 4] float64, (start.x, start.y, end.x, end.y) '''
+        return self.vertices[self.edgeVertices].reshape([len(self.edgeVertices), 4])
+
+    def siteNeighbors(self) -> Tuple[np.ndarray, np.ndarray]:
+        ''' (neighbors, neighborStart) int64, the neighbors of site i are neighbors[neighborStart[i]:neighborStart[i+1]] '''
+        if np.any(self.edgeSites < 0):
+            raise ValueError('Every edge needs its two sites, a text result has none')
+        pairs = np.concatenate([self.edgeSites, self.edgeSites[:, ::-1]]).astype(np.int64)
+        pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+        return pairs[:, 1], np.searchsorted(pairs[:, 0], np.arange(len(self.sites)+1))
+
+    def cells(self, bounds: Optional[Tuple[float, float, float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Every cell as a ccw ring of vertices, clipped to 'bounds' (xMin, yMin, xMax, yMax),
+        paddedBounds() of the sites by default.
 
-    def insertRectangle(self, event):
-        # print('insertRectangle')
-        self.canvas.setMode(Canvas.Mode.InsertRectangle)
-        # self.mode = self.Mode.InsertRectangle
+        See clipCells().
 
+        return (
+            vertices [nRingVertices, 2] float64,
+            starts [nSites+1] int64, the ring of site i is vertices[starts[i]:starts[i+1]], empty if outside 'bounds'
+        )
+        '''
+        return clipCells(self.sites, *self.siteNeighbors(), bounds)
 
-# def apply_indices(array: np.ndarray, indices: np.ndarray):
-#     indices = indices.reshape([len(indices), 1])
-#     array = np.take_along_axis(array, indices, 0)
-#     return array
+    def cellMeasures(self, bounds: Optional[Tuple[float, float, float, float]] = None) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ''' ringMeasures() of cells(bounds) '''
+        return ringMeasures(*self.cells(bounds))
 
+    def delaunay(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        The dual triangulation: a triangle per finite vertex, 4 or more cocircular sites are fanned.
 
-# def sortCcw(center: np.ndarray, points: np.ndarray):
-#     p2 = points.copy()
-#     points -= center
-#     xs = points[:, 0]
-#     ys = points[:, 1]
-#     helpXs = np.where(xs == 0, np.where(ys < 0, 0, 2), np.where(xs > 0, 1, 3))
-#     helpYs = np.where(xs == 0, ys, ys/xs)
-#     points = np.stack([helpXs, helpYs, xs, ys, p2[:, 0], p2[:, 1]], axis=-1)
-#     indices: np.ndarray
-#     indices = np.lexsort([ys, xs, helpYs, helpXs])
-#     points = apply_indices(points, indices)
-#     return points
+        return (
+            triangles [nTriangles, 3] int32 site indices, ccw,
+            neighbors [nTriangles, 3] int32, the triangle across the side opposite each site, -1 on the hull
+        )
+        '''
+        if np.any(self.edgeSites < 0):
+            raise ValueError('Every edge needs its two sites, a text result has none')
+        # (vertex, site) for both sites of both ends of every edge, only the finite ends
+        vertexOf = self.edgeVertices.ravel()
+        siteOf = np.repeat(self.edgeSites, 2, 0).ravel()
+        vertexOf = np.repeat(vertexOf, 2)
+        isFinite = ~self.vertexIsInfinite[vertexOf]
+        vertexOf = vertexOf[isFinite]
+        siteOf = siteOf[isFinite]
+        if len(vertexOf) == 0:
+            # On a line
+            return np.empty([0, 3], np.int32), np.empty([0, 3], np.int32)
+
+        # The sites around every vertex, each site is there twice
+        n = len(self.sites)
+        keys = np.sort(vertexOf.astype(np.int64)*n + siteOf)
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+        vertexOf = keys//n
+        ring = keys % n
+        starts = np.flatnonzero(np.concatenate([[True], vertexOf[1:] != vertexOf[:-1]]))
+        degrees = np.diff(np.append(starts, len(ring)))
+        starts = starts[degrees >= 3]
+        degrees = degrees[degrees >= 3]
+
+        # In ccw order: a triangle by its orientation, 4 or more cocircular sites by their angles
+        a, b, c = (self.sites[ring[starts[degrees == 3] + i]] for i in range(3))
+        if self.sites.dtype.kind in 'iu' and np.all(np.abs(self.sites) < 2**30):
+            a, b, c = a.astype(np.int64), b.astype(np.int64), c.astype(np.int64)
+        else:
+            a, b, c = a.astype(np.float64), b.astype(np.float64), c.astype(np.float64)
+        isCw = (b[:, 0]-a[:, 0])*(c[:, 1]-a[:, 1]) - (b[:, 1]-a[:, 1])*(c[:, 0]-a[:, 0]) < 0
+        cw = starts[degrees == 3][isCw]
+        ring[cw + 1], ring[cw + 2] = ring[cw + 2], ring[cw + 1].copy()
+        for start, degree in zip(starts[degrees > 3].tolist(), degrees[degrees > 3].tolist()):
+            vertex = self.vertices[vertexOf[start]]
+            d = self.sites[ring[start:start+degree]] - vertex
+            ring[start:start+degree] = ring[start:start+degree][np.argsort(np.arctan2(d[:, 1], d[:, 0]))]
+
+        # Fans (ring[0], ring[k], ring[k+1])
+        counts = degrees - 2
+        first = np.repeat(starts, counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        triangles = np.stack([ring[first], ring[first + k], ring[first + k + 1]], 1).astype(np.int32)
+
+        # The side opposite corner i goes from corner i+1 to i+2, its twin the other way
+        sides = np.stack([triangles[:, [1, 2, 0]], triangles[:, [2, 0, 1]]], 2).reshape([-1, 2]).astype(np.int64)
+        keys = sides[:, 0]*n + sides[:, 1]
+        twinKeys = sides[:, 1]*n + sides[:, 0]
+        order = np.argsort(keys)
+        i = np.minimum(np.searchsorted(keys[order], twinKeys), len(keys) - 1)
+        twins = order[i]
+        neighbors = np.where(keys[twins] == twinKeys, twins//3, -1).astype(np.int32).reshape([-1, 3])
+        return triangles, neighbors
+
+    def binaryLayout(self):
+        ''' [(array, little-endian dtype, shape)] in the order of the save() file '''
+        nHull = 0 if self.hull is None else len(self.hull)
+        return [(self.sites, '<i8' if self.sites.dtype.kind in 'iu' else '<f8', (len(self.sites), 2)),
+                (self.vertices, '<f8', (len(self.vertices), 2)),
+                (self.edgeVertices, '<i4', (len(self.edgeVertices), 2)),
+                (self.edgeSites, '<i4', (len(self.edgeVertices), 2)),
+                (self.edgeNeighbors, '<i4', (len(self.edgeVertices), 4)),
+                (self.hull, '<i4', (nHull,)),
+                # 1 byte each, last so that every other array stays 8-byte aligned
+                (self.vertexIsInfinite, '|b1', (len(self.vertices),))]
 
-def sortCcw(leftTop: Voronoi.Polygon, points: list):
-    '''
-    'leftTop': all points have same x with leftTop has smaller y than it
+    def save(self, fname):
+        '''
+        Binary format, all little-endian:
+            BINARY_MAGIC
+            int64 nSites, nVertices, nEdges, nHull (-1 if hull is None), sites are int (1) or float (0)
+            sites, vertices, edgeVertices, edgeSites, edgeNeighbors, hull, vertexIsInfinite
+        '''
+        header = np.array([len(self.sites), len(self.vertices), len(self.edgeVertices),
+                           -1 if self.hull is None else len(self.hull),
+                           self.sites.dtype.kind in 'iu'], '<i8')
+        with open(fname, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            f.write(header.tobytes())
+            for array, dtype, _ in self.binaryLayout():
+                if array is not None:
+                    f.write(np.ascontiguousarray(array, dtype).tobytes())
+
+    @staticmethod
+    def load(fname, mmap=True) -> 'CompactVoronoi':
+        ''' Open a save() file, the arrays are read-only views of the mapped file if 'mmap' '''
+        data = np.memmap(fname, np.uint8, 'r') if mmap else np.fromfile(fname, np.uint8)
+        offset = len(BINARY_MAGIC)+5*8
+        if len(data) < offset or data[:len(BINARY_MAGIC)].tobytes() != BINARY_MAGIC:
+            raise ValueError(f'{fname} is not a binary Voronoi file')
+        nSites, nVertices, nEdges, nHull, sitesAreInt = data[len(BINARY_MAGIC):offset].view('<i8').tolist()
+        v = CompactVoronoi(np.empty([nSites, 2], '<i8' if sitesAreInt else '<f8'),
+                           np.empty([nVertices, 2]), np.empty(nVertices, bool),
+                           np.empty([nEdges, 2], np.int32), None, None,
+                           None if nHull < 0 else np.empty(nHull, np.int32))
+        arrays = []
+        for _, dtype, shape in v.binaryLayout():
+            size = np.dtype(dtype).itemsize*int(np.prod(shape))
+            arrays.append(data[offset:offset+size].view(dtype).reshape(shape))
+            offset += size
+        if offset != len(data):
+            raise ValueError(f'{fname} is truncated or corrupted')
+        sites, vertices, edgeVertices, edgeSites, edgeNeighbors, hull, vertexIsInfinite = arrays
+        return CompactVoronoi(sites, vertices, vertexIsInfinite, edgeVertices, edgeSites, edgeNeighbors,
+                              None if nHull < 0 else hull)
+
+
+class PointLocator:
+    '''
+    Which site owns a point, for arrays of query points at once.
+
+    A query walks from site to site of the diagram, always to the neighbor nearest to it,
+    until no neighbor is nearer: a cell is where its site is nearer than each of its neighbors,
+    so that site is the nearest one.  The walk starts from the site nearest to the center of
+    the cell of a grid (about a site per cell) the query is in, so it takes a few steps.
+    All the queries walk a step together.
+
+    Exact up to the rounding of the distances: a point at the same distance of several sites
+    may go to any of them.
+    '''
 
-    if some points are collinear with 'leftTop',
-    sort those points by the distance between 'leftTop', nearest first.
+    # Queries walked at a time, to bound the memory
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, v: Union[Voronoi, CompactVoronoi]) -> None:
+        if isinstance(v, Voronoi):
+            v = v.compact()
+        self.sites = v.sites.astype(np.float64)
+        self.neighbors, self.neighborStart = v.siteNeighbors()
+
+        # Grid of 2**k x 2**k cells, the start site of a cell is found from that of its parent
+        self.origin = self.sites.min(0) if len(self.sites) > 0 else np.zeros(2)
+        extent = float((self.sites.max(0) - self.origin).max()) if len(self.sites) > 0 else 0
+        self.gridSize = 1
+        starts = np.zeros(1, np.int64)
+        while self.gridSize**2 < len(self.sites):
+            self.gridSize *= 2
+            rows, columns = np.divmod(np.arange(self.gridSize**2), self.gridSize)
+            starts = starts[(rows//2)*(self.gridSize//2) + columns//2]
+            self.cellSize = (extent if extent > 0 else 1)/self.gridSize
+            centers = self.origin + (np.stack([columns, rows], 1) + 0.5)*self.cellSize
+            starts = self.walk(centers, starts)
+        self.cellSize = (extent if extent > 0 else 1)/self.gridSize
+        self.cellStarts = starts
+
+    def walk(self, xy: np.ndarray, current: np.ndarray) -> np.ndarray:
+        ''' The nearest site to every point of 'xy' [n, 2], walking from the sites 'current' [n] '''
+        current = current.copy()
+        if len(self.sites) <= 1:
+            return current
+        distances = np.sum((xy - self.sites[current])**2, 1)
+        active = np.arange(len(xy))
+        while len(active) > 0:
+            sites = current[active]
+            first = self.neighborStart[sites]
+            degrees = self.neighborStart[sites+1] - first
+            query = np.repeat(np.arange(len(active)), degrees)
+            groupStart = np.cumsum(degrees) - degrees
+            neighbors = self.neighbors[np.repeat(first - groupStart, degrees) + np.arange(len(query))]
+            d = np.sum((xy[active[query]] - self.sites[neighbors])**2, 1)
+
+            # The nearest neighbor of every query, the first one if there are several
+            nearest = np.minimum.reduceat(d, groupStart)
+            isNearest = np.flatnonzero(d == nearest[query])
+            isNearest = isNearest[np.concatenate([[True], query[isNearest[1:]] != query[isNearest[:-1]]])]
+            isNearer = nearest < distances[active]
+            moved = active[isNearer]
+            current[moved] = neighbors[isNearest[isNearer]]
+            distances[moved] = nearest[isNearer]
+            active = moved
+        return current
+
+    def locate(self, xy: np.ndarray) -> np.ndarray:
+        ''' [n] int64 index of the site owning each point of 'xy' [n, 2] '''
+        xy = np.asarray(xy, np.float64).reshape([-1, 2])
+        result = np.empty(len(xy), np.int64)
+        for begin in range(0, len(xy), PointLocator.CHUNK_SIZE):
+            chunk = xy[begin:begin+PointLocator.CHUNK_SIZE]
+            cells = np.clip(np.floor((chunk - self.origin)/self.cellSize), 0, self.gridSize-1).astype(np.int64)
+            result[begin:begin+len(chunk)] = self.walk(chunk, self.cellStarts[cells[:, 1]*self.gridSize + cells[:, 0]])
+        return result
+
+
+def paddedBounds(sites: np.ndarray, padding: float = 0.05) -> Tuple[float, float, float, float]:
+    ''' (xMin, yMin, xMax, yMax) of the sites, padded by 'padding' of their extent and at least 1 '''
+    if len(sites) > 0:
+        low = sites.min(0).astype(np.float64)
+        high = sites.max(0).astype(np.float64)
+    else:
+        low = high = np.zeros(2)
+    margin = np.maximum((high-low)*padding, 1)
+    return (*(low-margin).tolist(), *(high+margin).tolist())
+
+
+def clipCells(sites: np.ndarray, neighbors: np.ndarray, neighborStart: np.ndarray,
+              bounds: Optional[Tuple[float, float, float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    The cells of 'sites' [n, 2] as ccw rings clipped to 'bounds', given the neighbors of every site
+    (CSR as from CompactVoronoi.siteNeighbors()), see CompactVoronoi.cells().
+
+    A cell is the box cut by the half-plane towards each neighbor: every round cuts all the cells
+    left by their next neighbor at once, the cells sorted by decreasing degree so that those are the first ones.
+    '''
+    xMin, yMin, xMax, yMax = paddedBounds(sites) if bounds is None else bounds
+    # Relative to the center of the box, for the precision of the cuts
+    center = np.array([xMin+xMax, yMin+yMax], np.float64)/2
+    sites = sites.astype(np.float64) - center
+    n = len(sites)
+    degrees = np.diff(neighborStart)
+    order = np.argsort(-degrees, kind='stable')
+    sortedDegrees = degrees[order]
+
+    box = np.array([[xMin, yMin], [xMax, yMin], [xMax, yMax], [xMin, yMax]], np.float64) - center
+    rings = np.tile(box, [n, 1])
+    starts = np.arange(n+1, dtype=np.int64)*4
+    done = []
+    for k in range(int(sortedDegrees[0]) if n > 0 else 0):
+        # Cells with more than k neighbors
+        nCut = int(np.searchsorted(-sortedDegrees, -k, 'left'))
+        done.append((rings[starts[nCut]:], np.diff(starts[nCut:])))
+        rings, starts = rings[:starts[nCut]], starts[:nCut+1]
+        cut = order[:nCut]
+        other = neighbors[neighborStart[cut]+k]
+        normals = sites[other] - sites[cut]
+        offsets = np.sum(normals*(sites[other] + sites[cut])/2, 1)
+        rings, starts = clipRings(rings, starts, normals, offsets)
+    done.append((rings, np.diff(starts)))
+
+    # Back to the order of the sites
+    rings = np.concatenate([r for r, _ in reversed(done)])
+    sizes = np.empty(n, np.int64)
+    sizes[order] = np.concatenate([s for _, s in reversed(done)])
+    ringStarts = np.empty(n, np.int64)
+    ringStarts[order] = np.cumsum(sizes[order]) - sizes[order]
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+    gather = np.repeat(ringStarts - starts[:-1], sizes) + np.arange(starts[-1])
+    return rings[gather] + center, starts
+
+
+def clipRings(vertices: np.ndarray, starts: np.ndarray, normals: np.ndarray, offsets: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Sutherland-Hodgman for many rings at once: the part of ring i (vertices[starts[i]:starts[i+1]])
+    where normals[i].p <= offsets[i], a ring of a convex polygon stays one.
+    return (vertices, starts) of the clipped rings, in the same order
     '''
-    nppoints = np.zeros([len(points), 2], np.float32)
-    for i, p in enumerate(points):
-        nppoints[i] = p.x, p.y
-    # nppointsBac = nppoints  # .copy()
-
-    leftTop = [leftTop.x, leftTop.y]
-    nppoints -= leftTop
-    xs = nppoints[:, 0]
-    ys = nppoints[:, 1]
-    helpXs = np.where(xs == 0, 0, 1)
+    sizes = np.diff(starts)
+    owner = np.repeat(np.arange(len(sizes)), sizes)
+    following = np.arange(1, len(vertices)+1)
+    isLast = starts[1:][sizes > 0] - 1
+    following[isLast] = starts[:-1][sizes > 0]
+
+    d = np.sum(vertices*normals[owner], 1) - offsets[owner]
+    isIn = d <= 0
+    isCrossing = ((d < 0) & (d[following] > 0)) | ((d > 0) & (d[following] < 0))
+    counts = isIn.astype(np.int64) + isCrossing
+    positions = np.cumsum(counts) - counts
+    result = np.empty([positions[-1] + counts[-1] if len(counts) > 0 else 0, 2], np.float64)
+    result[positions[isIn]] = vertices[isIn]
+    a = vertices[isCrossing]
+    b = vertices[following[isCrossing]]
+    t = d[isCrossing]/(d[isCrossing] - d[following[isCrossing]])
+    result[positions[isCrossing] + isIn[isCrossing]] = a + t[:, None]*(b - a)
+
+    sizes = np.bincount(owner, counts, len(sizes)).astype(np.int64)
+    return result, np.concatenate([[0], np.cumsum(sizes)])
+
+
+def ringMeasures(vertices: np.ndarray, starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Shoelace formulas of every ring i (vertices[starts[i]:starts[i+1]], ccw) at once.
+    return (areas [n], centroids [n, 2] nan if the ring has no area, perimeters [n])
+    '''
+    sizes = np.diff(starts)
+    n = len(sizes)
+    owner = np.repeat(np.arange(n), sizes)
+    following = np.arange(1, len(vertices)+1)
+    following[starts[1:][sizes > 0] - 1] = starts[:-1][sizes > 0]
+    # Relative to the first vertex of each ring, for the precision
+    first = vertices[starts[:-1][owner]] if len(owner) > 0 else vertices
+    p = vertices - first
+    q = vertices[following] - first
+
+    cross = p[:, 0]*q[:, 1] - q[:, 0]*p[:, 1]
+    areas = np.bincount(owner, cross, n)/2
+    moments = np.stack([np.bincount(owner, (p[:, i] + q[:, i])*cross, n) for i in range(2)], 1)
     with np.errstate(divide='ignore', invalid='ignore'):
-        helpYs = np.where(xs == 0, -ys, ys/xs)
-    # nppoints = np.stack(
-    #     [helpXs, helpYs, xs, ys, nppointsBac[:, 0], nppointsBac[:, 1]], axis=-1)
-    indices: np.ndarray
-    indices = np.lexsort([xs, helpYs, helpXs])
-    # print(nppoints[:,:4])
-
-    result = []
-    for i in indices:
-        result.append(points[i])
-    return result
+        centroids = np.where(areas[:, None] != 0, moments/(6*areas[:, None]), np.nan)
+    hasVertices = sizes > 0
+    centroids[hasVertices] += vertices[starts[:-1][hasVertices]]
+    perimeters = np.bincount(owner, np.hypot(*(q - p).T), n)
+    return areas, centroids, perimeters
 
 
-def ccw(A: Point, B: Point, C: Point = None) -> float:
+def ccwXY(ax, ay, bx, by, cx, cy) -> float:
     '''
     return > 0: Left turn
 
     return = 0: On the same line
 
     return < 0: Right turn
+
+    A float filter, exact on rationals when too close to call.
     '''
-    # return (B[0] - A[0])*(C[1] - A[1]) - (B[1] - A[1])*(C[0] - A[0])
-    # return (B.x - A.x)*(C.y - A.y) - (B.y - A.y)*(C.x - A.x)
-    if C is None:
-        return A*B
-    return (B-A)*(C-A)
+    detLeft = (bx - ax)*(cy - ay)
+    detRight = (by - ay)*(cx - ax)
+    det = detLeft - detRight
+    if type(det) is int:
+        return det
+    errorBound = CCW_ERROR_BOUND*(abs(detLeft) + abs(detRight))
+    if det > errorBound or -det > errorBound:
+        return det
+    # Too close to call with floats, the sign is exact on rationals
+    ax, ay, bx, by, cx, cy = (Fraction(a) for a in (ax, ay, bx, by, cx, cy))
+    return float((bx - ax)*(cy - ay) - (by - ay)*(cx - ax))
+
+
+def ccwExact(A: Voronoi.Polygon, B: Voronoi.Polygon, C: Voronoi.Polygon) -> int:
+    ''' ccwXY() on exactX, exactY, see setExactCoordinates() '''
+    return (B.exactX - A.exactX)*(C.exactY - A.exactY) - (B.exactY - A.exactY)*(C.exactX - A.exactX)
+
+
+def circumcenterExact(A: Voronoi.Polygon, B: Voronoi.Polygon, C: Voronoi.Polygon) -> Optional[Tuple[int, int, int]]:
+    ''' The center of the circle through the sites as Vertex.exact, None if they are collinear '''
+    bx, by = B.exactX - A.exactX, B.exactY - A.exactY
+    cx, cy = C.exactX - A.exactX, C.exactY - A.exactY
+    d = 2*(bx*cy - by*cx)
+    if d == 0:
+        return None
+    b2 = bx*bx + by*by
+    c2 = cx*cx + cy*cy
+    return A.exactX*d + cy*b2 - by*c2, A.exactY*d + bx*c2 - cx*b2, d
+
+
+def isSameVertex(u: Voronoi.Vertex, w: Voronoi.Vertex) -> bool:
+    ''' Are the finite vertices at the same place, decided on Vertex.exact, not on the rounded coordinates '''
+    if u is w:
+        return True
+    if u.exact is None or w.exact is None:
+        return False
+    X1, Y1, D1 = u.exact
+    X2, Y2, D2 = w.exact
+    return X1*D2 == X2*D1 and Y1*D2 == Y2*D1
+
+
+def setExactVertices(v: Voronoi):
+    ''' Set Vertex.exact of the finite vertices of 'v' that have none, from three of the sites around each '''
+    around = {}
+    for e in v.edges:
+        for vertex in (e.startVertex, e.endVertex):
+            if vertex.isInfinite or vertex.exact is not None:
+                continue
+            sites = around.setdefault(id(vertex), (vertex, {}))[1]
+            sites[id(e.leftPolygon)] = e.leftPolygon
+            sites[id(e.rightPolygon)] = e.rightPolygon
+    for vertex, sites in around.values():
+        if len(sites) >= 3:
+            vertex.exact = circumcenterExact(*list(sites.values())[:3])
 
 
-def GrahamScan(leftTop: Voronoi.Polygon, points: list):
+def isCcwBetween(A: Tuple[int, int], B: Tuple[int, int], C: Tuple[int, int]) -> bool:
     '''
+    Is direction B strictly inside the ccw sweep from direction A to direction C.
+    Exact for integer vectors.
+    '''
+    def isFirstHalf(V):
+        ''' angle from A in [0, 180) '''
+        cross = A[0]*V[1] - A[1]*V[0]
+        return cross > 0 or (cross == 0 and A[0]*V[0] + A[1]*V[1] > 0)
+    if A[0]*B[1] - A[1]*B[0] == 0 and A[0]*B[0] + A[1]*B[1] > 0:
+        return False  # same direction as A
+    bFirst = isFirstHalf(B)
+    cFirst = isFirstHalf(C)
+    if bFirst != cFirst:
+        return bFirst
+    return B[0]*C[1] - B[1]*C[0] > 0
+
+
+def siteArrays(P: List[Voronoi.Polygon]) -> Tuple[List[Voronoi.Polygon], List[int], List[int]]:
+    ''' (P, exactX, exactY) of the sorted sites, the hull chains of the merge are indices of them '''
+    return P, [p.exactX for p in P], [p.exactY for p in P]
+
+
+def monotoneChain(indices: List[int], X: List[int], Y: List[int]) -> List[int]:
+    '''
+    Half of the convex hull of the sites (X[i], Y[i]) of 'indices', walked in the order of 'indices':
+    sorted by Point.__lt__ it is the lower chain, reversed it is the upper one.
+
     Collinear points would be kept, in both direction.
     '''
-    ccwP = sortCcw(leftTop, points)
+    chain = []
+    for i in indices:
+        while len(chain) >= 2 and ccwXY(X[chain[-2]], Y[chain[-2]], X[chain[-1]], Y[chain[-1]], X[i], Y[i]) < 0:
+            chain.pop()
+        chain.append(i)
+    return chain
+
+
+def mergeConvexHulls(chainsL: Tuple[List[int], List[int]], chainsR: Tuple[List[int], List[int]],
+                     X: List[int], Y: List[int]) -> Tuple[List[int], List[int]]:
+    '''
+    'chainsL', 'chainsR': (lower chain left to right, upper chain right to left) of the convex hull of each half,
+    as indices of the sites sorted by Point.__lt__, every index of 'chainsL' is less than every index of 'chainsR'.
+    'X', 'Y': exactX, exactY of all the sites.
+
+    Monotone chain over the two chains only, so no sorting is needed: O(size of both hulls)
+
+    return (lower chain, upper chain) of the merged convex hull
+    '''
+    return monotoneChain(chainsL[0] + chainsR[0], X, Y), monotoneChain(chainsR[1] + chainsL[1], X, Y)
+
+
+def getCrossEdges(lower: List[int], upper: List[int], mid: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    '''
+    The edges of the merged convex hull (lower, upper) from mergeConvexHulls() between the halves,
+    the right one starting at index 'mid'.
+
+    An Edge is returned left first as: (leftIndex, rightIndex)
+    return (crossEdgeTop, crossEdgeBottom)
+    '''
+    i = bisect_left(lower, mid)
+    # The upper chain is decreasing
+    j = 1
+    while upper[j] >= mid:
+        j += 1
+    return (upper[j], upper[j-1]), (lower[i-1], lower[i])
+
+
+class MergeObserver:
+    '''
+    Watches the divide-and-conquer merge, e.g. to visualize it step by step.
+
+    Every hook is a no-op here; override the ones you need.
+    The solver never calls a hook when no observer is attached.
+    '''
+
+    def crossEdges(self, vL: Voronoi, vR: Voronoi, crossEdgeTop: list, crossEdgeBottom: list):
+        ''' Both halves are solved and the cross edges of the merged convex hull are found '''
+
+    def hyperplaneStep(self, vL: Voronoi, vR: Voronoi, HP: List[Voronoi.Edge], crossEdgeTop: list,
+                       crossEdgeBottom: list, leftPolygonEdges: List[Voronoi.Edge],
+                       rightPolygonEdges: List[Voronoi.Edge]):
+        ''' A new bisector is appended to HP '''
+
+    def intersection(self, intersection: Voronoi.Vertex):
+        ''' HP leaves the cell of its left or right Polygon at this new vertex '''
+
+    def intersectionNotFound(self):
+        ''' The HP walk stopped before reaching crossEdgeBottom '''
+
+    def hyperplaneDone(self, v: Voronoi):
+        ''' The whole HP is built, edges across it are not deleted yet '''
+
+    def edgesDeleted(self, v: Voronoi):
+        ''' Edges on the wrong side of HP are deleted '''
+
+
+class MergeProfile:
+    '''
+    Time and counts of the phases of the merges, summed per recursion level, 0 being the last merge.
+
+        hull:       mergeConvexHulls() and getCrossEdges() on the hull chains of both halves
+        hyperplane: the HP walk, exits are looked for among the edges of the cells HP goes through
+        deletion:   the edges on the wrong side of HP are deleted, HP is attached to the merged edges
+
+    Pass one to compute(), the solver reads no clock without it.
+    Like an observer, it only sees the merges done in this process.
+    '''
+    COUNTERS = ('merges', 'sites', 'hullSeconds', 'hullSites', 'hyperplaneSeconds', 'bisectors',
+                'exitScans', 'deletionSeconds', 'deletionScans', 'deletedEdges')
+
+    def __init__(self) -> None:
+        self.levels: List[dict] = []
+
+    def add(self, level: int, **counts):
+        ''' Add the counts of a merge at 'level' '''
+        while len(self.levels) <= level:
+            self.levels.append(dict.fromkeys(MergeProfile.COUNTERS, 0))
+        counters = self.levels[level]
+        counters['merges'] += 1
+        for name, count in counts.items():
+            counters[name] += count
+
+    def report(self) -> List[dict]:
+        ''' A dict of 'level' and the COUNTERS per level, from the last merge down '''
+        return [{'level': level, **counters} for level, counters in enumerate(self.levels)]
+
+    def __str__(self):
+        lines = ['level ' + ' '.join(f'{name:>{max(len(name), 9)}}' for name in MergeProfile.COUNTERS)]
+        for row in self.report():
+            lines.append(f'{row["level"]:>5} ' + ' '.join(
+                f'{row[name]:>{max(len(name), 9)}.{6 if name.endswith("Seconds") else 0}f}'
+                for name in MergeProfile.COUNTERS))
+        return '\n'.join(lines)
+
+
+def dedup(P: List[Voronoi.Polygon]) -> List[Voronoi.Polygon]:
+    '''
+    Sort 'P' in place (small x first, then big y first),
+    return the sorted Polygons without duplicates.
+    '''
+    # sort by __lt__
+    P.sort()
+
+    countNoDuplicate = 1
+    for i in range(1, len(P)):
+        if P[i] != P[countNoDuplicate-1]:
+            P[countNoDuplicate] = P[i]
+            countNoDuplicate += 1
+    return P[:countNoDuplicate]
+
+
+def setExactCoordinates(P: List[Voronoi.Polygon]) -> int:
+    '''
+    Set exactX, exactY of every Polygon to integers:
+    the coordinates times the least common denominator of all of them,
+    which is a power of two for floats.  Integer coordinates are kept as is.
+
+    return the scale
+    '''
+    scale = 1
+    for p in P:
+        for a in (p.x, p.y):
+            if type(a) is not int:
+                scale = lcm(scale, Fraction(a).denominator)
+    for p in P:
+        if scale == 1:
+            p.exactX = int(p.x)
+            p.exactY = int(p.y)
+        else:
+            p.exactX = int(Fraction(p.x)*scale)
+            p.exactY = int(Fraction(p.y)*scale)
+    return scale
+
+
+def exactArray(xy: np.ndarray) -> Tuple[np.ndarray, int]:
+    '''
+    setExactCoordinates() on an int64 or float64 array [n, 2]:
+    (int64 array, or an object array of ints if they do not fit, scale)
+    '''
+    if xy.dtype.kind in 'iu':
+        return xy.astype(np.int64), 1
+    # x = mantissa*2**(exponent-53), the denominator is 2**(53-exponent-(trailing zeros of the mantissa))
+    fractions, exponents = np.frexp(xy)
+    mantissas = np.ldexp(fractions, 53).astype(np.int64)
+    isZero = mantissas == 0
+    lowestBits = np.where(isZero, 1, mantissas & -mantissas)
+    trailingZeros = np.frexp(lowestBits.astype(np.float64))[1] - 1
+    shift = int(np.max(np.where(isZero, 0, np.maximum(0, 53 - exponents - trailingZeros)), initial=0))
+    # A power of two, the product is exact unless it overflows
+    with np.errstate(over='ignore'):
+        scaled = np.ldexp(xy, shift)
+    if np.all(np.abs(scaled) < 2.0**63):
+        return scaled.astype(np.int64), 1 << shift
+    if np.all(np.isfinite(scaled)):
+        return np.array([[int(x), int(y)] for x, y in scaled.tolist()], object).reshape(xy.shape), 1 << shift
+    return np.array([[int(Fraction(x)*(1 << shift)), int(Fraction(y)*(1 << shift))]
+                     for x, y in xy.tolist()], object).reshape(xy.shape), 1 << shift
+
+
+def isCollinear(exact: np.ndarray) -> bool:
+    ''' Are the sites of 'exact' [n, 2] (sorted, no duplicates) on one line, exact '''
+    if len(exact) <= 2:
+        return True
+    if exact.dtype != object and np.all(np.abs(exact) < 2**30):
+        d = exact - exact[0]
+    else:
+        d = exact.astype(object) - exact[0]
+    return bool(np.all(d[:, 0]*d[-1, 1] == d[:, 1]*d[-1, 0]))
+
+
+def preprocess(points) -> Tuple[List[Voronoi.Polygon], int, bool]:
+    '''
+    Sort, dedup and classify the sites with array operations instead of Polygon comparisons.
+
+    'points': as for compute().  Polygons are kept as they are, anything else becomes a new Polygon,
+    only after the duplicates are dropped.
+
+    return (
+        the Polygons sorted by Point.__lt__ without duplicates, exactX and exactY set,
+        the scale of setExactCoordinates(),
+        are all the sites on one line
+    )
+    '''
+    isArray = isinstance(points, np.ndarray)
+    # Only the coordinates until the duplicates are gone, the Polygons are made or reused once at the end
+    isPoints = not isArray and all(isinstance(p, Point) for p in points)
+    if isArray:
+        xy = points
+    elif isPoints:
+        xy = np.array([(p.x, p.y) for p in points])
+    else:
+        xy = np.array([tuple(p) for p in points])
+    xy = xy.reshape([len(points), 2])
+
+    # Ints too big for int64 and mixed ints and floats too big for float64 are sorted the slow way
+    if xy.dtype.kind not in 'iuf' or (xy.dtype.kind == 'f' and not isArray and
+                                       np.any(np.abs(xy) >= 2.0**53)):
+        P = dedup([toPolygon(p) for p in points])
+        scale = setExactCoordinates(P)
+        return P, scale, isCollinear(np.array([(p.exactX, p.exactY) for p in P], object))
+    if xy.dtype.kind == 'f':
+        xy = xy.astype(np.float64)
+
+    # Point.__lt__: small x first, then big y first.  Stable, so the first of equal sites is kept
+    order = np.lexsort([-xy[:, 1], xy[:, 0]])
+    xy = xy[order]
+    isFirst = np.concatenate([[True], np.any(xy[1:] != xy[:-1], 1)])
+    order = order[isFirst]
+    xy = xy[isFirst]
+    exact, scale = exactArray(xy)
+
+    if not isPoints:
+        P = [Voronoi.Polygon(x, y) for x, y in xy.tolist()]
+    else:
+        P = [toPolygon(points[i]) for i in order.tolist()]
+    for p, (x, y) in zip(P, exact.tolist()):
+        p.exactX = x
+        p.exactY = y
+    return P, scale, isCollinear(exact)
+
+
+def rayBounds(sites: np.ndarray) -> Tuple[float, float, float, float]:
+    '''
+    The default bounds of compute(): the sites padded by their extent,
+    and by at least WIN_SIZE so that the infinite edges still cross the window of the GUI.
+    '''
+    if len(sites) > 0:
+        low = sites.min(0).astype(np.float64)
+        high = sites.max(0).astype(np.float64)
+    else:
+        low = high = np.zeros(2)
+    margin = max(float((high-low).max()), WIN_SIZE)
+    return (*(low-margin).tolist(), *(high+margin).tolist())
+
+
+def rayEnd(x, y, dx, dy, bounds: Tuple[float, float, float, float]) -> Tuple[float, float]:
+    '''
+    Where the ray from (x, y) along (dx, dy) leaves 'bounds',
+    or the diagonal of 'bounds' away from (x, y) if it is not inside.
+    '''
+    xMin, yMin, xMax, yMax = bounds
+    if xMin < x < xMax and yMin < y < yMax:
+        t = min((xMax - x)/dx if dx > 0 else (xMin - x)/dx if dx < 0 else inf,
+                (yMax - y)/dy if dy > 0 else (yMin - y)/dy if dy < 0 else inf)
+    else:
+        t = sqrt(((xMax - xMin)**2 + (yMax - yMin)**2)/(dx*dx + dy*dy))
+    return x + t*dx, y + t*dy
+
+
+def placeInfiniteEnds(v: Voronoi, bounds: Optional[Tuple[float, float, float, float]] = None):
+    '''
+    Put every infinite end of 'v' where its ray leaves 'bounds' (rayBounds() of the sites by default),
+    and keep them in v.bounds for insert() and remove().
+    A ray goes from the finite end of its edge, or from the middle of the sites of a line,
+    along the exact direction of the bisector: the fake ends of the merge are not used.
+    '''
+    if bounds is None:
+        bounds = rayBounds(np.array([(p.x, p.y) for p in v.P], np.float64))
+    v.bounds = bounds
+    # Only the cells of the convex hull are unbounded
+    done = set()
+    for p in (v.P if v.hull is None else v.hull):
+        for e in p.incidentEdges:
+            if id(e) in done or not (e.startVertex.isInfinite or e.endVertex.isInfinite):
+                continue
+            done.add(id(e))
+            setInfiniteEnds(e, bounds)
+
+
+def setInfiniteEnds(e: Voronoi.Edge, bounds: Tuple[float, float, float, float]):
+    ''' Move the infinite ends of 'e' to where its rays leave 'bounds', see placeInfiniteEnds() '''
+    L = e.leftPolygon
+    R = e.rightPolygon
+    # startVertex -> endVertex, exact up to the rounding to float
+    dx = float(L.exactY - R.exactY)
+    dy = float(R.exactX - L.exactX)
+    start = e.startVertex
+    end = e.endVertex
+    if start.isInfinite:
+        anchor = ((L.x + R.x)/2, (L.y + R.y)/2) if end.isInfinite else (end.x, end.y)
+        start.x, start.y = rayEnd(*anchor, -dx, -dy, bounds)
+    if end.isInfinite:
+        anchor = ((L.x + R.x)/2, (L.y + R.y)/2) if start.isInfinite else (start.x, start.y)
+        end.x, end.y = rayEnd(*anchor, dx, dy, bounds)
+
+
+def compute(points: list, observer: Optional[MergeObserver] = None,
+            compact=False, processes: Optional[int] = 1,
+            profile: Optional[MergeProfile] = None,
+            bounds: Optional[Tuple[float, float, float, float]] = None) -> Union[Voronoi, CompactVoronoi, None]:
+    '''
+    Headless entry point: no Qt is needed.
+
+    'points': Points (or Voronoi.Polygons) or (x, y) pairs, or an array of shape [n, 2].
+    Duplicated points are ignored.
+    'compact': return a CompactVoronoi instead, the object graph is dropped right away.
+    'processes': solve the sub-diagrams of the top levels in this many worker processes,
+    None for one per core.  'observer' only sees the merges done in this process then.
+    'profile': gets the time and counts of every phase of the merges.
+    'bounds': (xMin, yMin, xMax, yMax) the infinite edges are cut at, rayBounds() of the points by default,
+    see placeInfiniteEnds().
+
+    return None if there is no point.
+    '''
+    if points is None or len(points) <= 0:
+        return None
+    P, scale, collinear = preprocess(points)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # Levels of the recursion to split among the processes
+    depth = 0
+    while 2**depth < processes and len(P) >> (depth+1) >= PARALLEL_MIN_SITES:
+        depth += 1
+    if collinear and observer is None:
+        v = _voronoiCollinear(P)
+    elif depth > 0:
+        v = _voronoiParallel(P, observer, scale, processes, depth, profile)
+    else:
+        v = _voronoi(P, observer, scale, profile)
+    v.scale = scale
+    placeInfiniteEnds(v, bounds)
+    if compact:
+        return v.compact()
+    return v
+
+
+def inCircle(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> np.ndarray:
+    ''' > 0 where d is in the circumcircle of the ccw triangle (a, b, c), all [n, 2] float64 '''
+    a, b, c = a - d, b - d, c - d
+    return (np.sum(a**2, 1)*(b[:, 0]*c[:, 1] - b[:, 1]*c[:, 0]) -
+            np.sum(b**2, 1)*(a[:, 0]*c[:, 1] - a[:, 1]*c[:, 0]) +
+            np.sum(c**2, 1)*(a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]))
+
+
+def inCircleXY(ax, ay, bx, by, cx, cy, dx, dy) -> float:
+    ''' inCircle() on the coordinates of one quadruple '''
+    ax, ay, bx, by, cx, cy = ax - dx, ay - dy, bx - dx, by - dy, cx - dx, cy - dy
+    return ((ax*ax + ay*ay)*(bx*cy - by*cx) - (bx*bx + by*by)*(ax*cy - ay*cx) +
+            (cx*cx + cy*cy)*(ax*by - ay*bx))
+
+
+def isTriangulation(sites: np.ndarray, triangles: np.ndarray, neighbors: np.ndarray) -> bool:
+    '''
+    Is a triangulation of CompactVoronoi.delaunay() still one of the moved 'sites' [n, 2] float64:
+    every triangle ccw and the hull convex.  Up to the rounding of float64.
+    '''
+    if len(triangles) == 0:
+        return False
+    a, b, c = (sites[triangles[:, i]] for i in range(3))
+    if np.any((b[:, 0]-a[:, 0])*(c[:, 1]-a[:, 1]) - (b[:, 1]-a[:, 1])*(c[:, 0]-a[:, 0]) <= 0):
+        return False
+    # The hull sides go ccw from corner i+1 to corner i+2 of their triangle
+    t, i = np.nonzero(neighbors < 0)
+    start = triangles[t, (i+1) % 3]
+    end = triangles[t, (i+2) % 3]
+    following = np.full(len(sites), -1, np.int64)
+    following[start] = end
+    if np.any(following[end] < 0):
+        return False
+    a, b, c = sites[start], sites[end], sites[following[end]]
+    return not np.any((b[:, 0]-a[:, 0])*(c[:, 1]-b[:, 1]) - (b[:, 1]-a[:, 1])*(c[:, 0]-b[:, 0]) < 0)
+
+
+def flipToDelaunay(sites: np.ndarray, triangles: np.ndarray, neighbors: np.ndarray, maxRounds=100) -> bool:
+    '''
+    Lawson's flips: make a triangulation of CompactVoronoi.delaunay() that of the moved 'sites' again,
+    in place, by flipping every side whose site across is in the circumcircle, round after round.
+    The sides to flip are found with arrays, only the flips are done one by one.
+
+    return False if it is not isTriangulation() or still has such sides after 'maxRounds'
+    '''
+    if not isTriangulation(sites, triangles, neighbors):
+        return False
+    # Triangles whose sides are checked, after the first round only those flipped
+    checked = np.arange(len(triangles))
+    for _ in range(maxRounds):
+        t = np.repeat(checked, 3)
+        i = np.tile(np.arange(3), len(checked))
+        isInner = neighbors[t, i] >= 0
+        t, i = t[isInner], i[isInner]
+        across = neighbors[t, i]
+        j = np.argmax(neighbors[across] == t[:, None], 1)
+        isIllegal = inCircle(*(sites[triangles[t, k]] for k in range(3)), sites[triangles[across, j]]) > 0
+        if not np.any(isIllegal):
+            return True
+        flipped = set()
+        for t, i in zip(t[isIllegal].tolist(), i[isIllegal].tolist()):
+            # Triangles (p, a, b) and (q, b, a) become (p, a, q) and (q, b, p), if both are still ccw
+            u = int(neighbors[t, i])
+            if u < 0:
+                continue
+            j = neighbors[u].tolist().index(t)
+            p, a, b = triangles[t, i], triangles[t, (i+1) % 3], triangles[t, (i+2) % 3]
+            q = triangles[u, j]
+            if triangles[u, (j+1) % 3] != b or triangles[u, (j+2) % 3] != a:
+                continue
+            P, A, B, Q = sites[[p, a, b, q]].tolist()
+            if inCircleXY(*P, *A, *B, *Q) <= 0 or ccwXY(*P, *A, *Q) <= 0 or ccwXY(*Q, *B, *P) <= 0:
+                continue
+            na, nb = neighbors[t, (i+2) % 3], neighbors[t, (i+1) % 3]
+            ua, ub = neighbors[u, (j+1) % 3], neighbors[u, (j+2) % 3]
+            triangles[t] = (p, a, q)
+            neighbors[t] = (ua, u, na)
+            triangles[u] = (q, b, p)
+            neighbors[u] = (nb, t, ub)
+            if ua >= 0:
+                neighbors[ua][neighbors[ua] == u] = t
+            if nb >= 0:
+                neighbors[nb][neighbors[nb] == t] = u
+            flipped.update((t, u))
+        checked = np.array(sorted(flipped), np.int64)
+    return False
+
+
+def triangulationNeighbors(n: int, triangles: np.ndarray, neighbors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ''' CompactVoronoi.siteNeighbors() of the Voronoi diagram dual to a triangulation of n sites '''
+    sides = np.concatenate([triangles[:, [k, (k+1) % 3]] for k in range(3)]).astype(np.int64)
+    # Every inner side is there both ways, a hull side once
+    isHull = np.concatenate([neighbors[:, (k+2) % 3] < 0 for k in range(3)])
+    pairs = np.concatenate([sides, sides[isHull, ::-1]])
+    pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+    return pairs[:, 1], np.searchsorted(pairs[:, 0], np.arange(n+1))
+
+
+def moveTriangulation(sites: np.ndarray, targets: np.ndarray, triangles: np.ndarray, neighbors: np.ndarray,
+                      maxSteps=32) -> bool:
+    '''
+    Move 'sites' to 'targets' in place, keeping a Delaunay triangulation of them (in place too):
+    all the sites go half the way to where a triangle would turn over first, then flipToDelaunay(),
+    until they are there.  The hull must not change.
+
+    return False if they are not there after 'maxSteps' steps, or flipToDelaunay() failed
+    '''
+    for _ in range(maxSteps):
+        # The orientation of every triangle is o0 + o1*t + o2*t**2 on the way
+        moves = targets - sites
+        a, b, c = (sites[triangles[:, i]] for i in range(3))
+        da, db, dc = (moves[triangles[:, i]] for i in range(3))
+        ab, ac, dab, dac = b - a, c - a, db - da, dc - da
+        o0 = ab[:, 0]*ac[:, 1] - ab[:, 1]*ac[:, 0]
+        o1 = ab[:, 0]*dac[:, 1] - ab[:, 1]*dac[:, 0] + dab[:, 0]*ac[:, 1] - dab[:, 1]*ac[:, 0]
+        o2 = dab[:, 0]*dac[:, 1] - dab[:, 1]*dac[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q = -(o1 + np.copysign(np.sqrt(o1**2 - 4*o2*o0), o1))/2
+            roots = np.concatenate([q/o2, o0/q])
+        roots = roots[np.isfinite(roots) & (roots > 0)]
+        first = float(roots.min()) if len(roots) > 0 else np.inf
+
+        if first > 1:
+            sites[:] = targets
+        else:
+            sites += moves*(first/2)
+        if not flipToDelaunay(sites, triangles, neighbors):
+            return False
+        if first > 1:
+            return True
+    return False
+
+
+def lloyd(points, bounds: Optional[Tuple[float, float, float, float]] = None, tolerance=1e-6,
+          maxIterations=50, processes: Optional[int] = 1) -> Tuple[np.ndarray, int]:
+    '''
+    Lloyd relaxation towards a centroidal Voronoi diagram: move every site to the centroid of its cell
+    clipped to 'bounds' (paddedBounds() of the sites by default), until no site moves more than
+    'tolerance' times the diagonal of 'bounds', or 'maxIterations' times.
 
-    # Repeat last collinear points
-    iLast = len(ccwP)-1
-    A = ccwP[0]
-    C = ccwP[iLast]
-    for i in range(iLast-1, 0, -1):
-        if ccw(A, ccwP[i], C) != 0:
+    The sites move little, so an iteration does not sort, dedup or merge anything: moveTriangulation()
+    takes the Delaunay triangulation of the previous one along, and clipCells() cuts the cells along
+    its edges.  compute() is run again only if that fails.  4 sites far around all the others
+    make the hull, so that it never changes, and they are too far to cut a cell in 'bounds'.
+
+    'points': as for compute(), duplicates are dropped.  A site with no cell in 'bounds' stays where it is.
+    return (sites [n, 2] float64 in the order of compute(points).sites, the iterations done)
+    '''
+    P, _, _ = preprocess(points) if points is not None and len(points) > 0 else ([], 1, True)
+    if len(P) == 0:
+        return np.empty([0, 2], np.float64), 0
+    sites = np.array([(p.x, p.y) for p in P], np.float64)
+    n = len(sites)
+    if bounds is None:
+        bounds = paddedBounds(sites)
+    xMin, yMin, xMax, yMax = bounds
+    maxStep = tolerance*np.hypot(xMax-xMin, yMax-yMin)
+
+    low = np.minimum(sites.min(0), (xMin, yMin))
+    high = np.maximum(sites.max(0), (xMax, yMax))
+    size = 4*np.hypot(*(high-low)) + 1
+    ghosts = (low+high)/2 + size*np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], np.float64)
+    sites = np.concatenate([sites, ghosts])
+    # Index of every site in 'points' sorted, ghosts last, as 'sites' are sorted for compute()
+    original = np.arange(len(sites))
+
+    def triangulate():
+        nonlocal sites, original
+        order = np.lexsort([-sites[:, 1], sites[:, 0]])
+        sites = sites[order]
+        original = original[order]
+        v = compute(sites, compact=True, processes=processes)
+        if len(v.sites) != len(sites):
+            raise ValueError('Two sites moved to the same centroid')
+        return v.delaunay()
+
+    triangles, triangleNeighbors = triangulate()
+    iteration = 0
+    while iteration < maxIterations:
+        iteration += 1
+        neighbors, neighborStart = triangulationNeighbors(len(sites), triangles, triangleNeighbors)
+        _, centroids, _ = ringMeasures(*clipCells(sites, neighbors, neighborStart, bounds))
+        targets = np.where(np.isnan(centroids) | (original >= n)[:, None], sites, centroids)
+        step = float(np.max(np.hypot(*(targets - sites).T)))
+        if step <= maxStep or iteration == maxIterations:
+            sites = targets
             break
-        ccwP.append(ccwP[i])
-    # print(ccwP)
-
-    # GrahamScan
-    i = 2
-    resultCount = 2
-
-    while i < len(ccwP):
-        C = ccwP[i]
-        isCcw = ccw(ccwP[resultCount-2], ccwP[resultCount-1], C)
-        if isCcw >= 0:
-            i += 1
-            ccwP[resultCount] = C
-            resultCount += 1
+        if not moveTriangulation(sites, targets, triangles, triangleNeighbors):
+            sites = targets
+            triangles, triangleNeighbors = triangulate()
+
+    result = np.empty_like(sites)
+    result[original] = sites
+    return result[:n], iteration
+
+
+def solveSubdiagram(sites: List[Tuple[float, float, int, int]], scale) -> CompactVoronoi:
+    '''
+    Run in a worker process of _voronoiParallel(): _voronoi() of (x, y, exactX, exactY) of sites
+    already sorted and without duplicates, so there is no preprocess() and no placeInfiniteEnds() to redo.
+    CompactVoronoi pickles as a few arrays, unlike the linked Edges.
+    '''
+    P = []
+    for x, y, exactX, exactY in sites:
+        p = Voronoi.Polygon(x, y)
+        p.exactX = exactX
+        p.exactY = exactY
+        P.append(p)
+    return _voronoi(P, scale=scale).compact()
+
+
+def _voronoiParallel(P: List[Voronoi.Polygon], observer: Optional[MergeObserver], scale,
+                     processes: int, depth: int, profile: Optional[MergeProfile] = None) -> Voronoi:
+    '''
+    _voronoi() with the 2**depth sub-diagrams of the top 'depth' levels solved on a process pool.
+    The halves are split the same way, so the result is the same as _voronoi().
+    The merges start as soon as the sub-diagrams they need are back.
+    '''
+    sites = siteArrays(P)
+    _, X, Y = sites
+    slices = [P]
+    for _ in range(depth):
+        slices = [half for p in slices for half in (p[:len(p)//2], p[len(p)//2:])]
+    with multiprocessing.Pool(processes) as pool:
+        subdiagrams = pool.imap(partial(solveSubdiagram, scale=scale),
+                                [[(p.x, p.y, p.exactX, p.exactY) for p in slice] for slice in slices])
+
+        def solve(polygons: List[Voronoi.Polygon], level: int, start: int) -> Voronoi:
+            if level == depth:
+                subdiagram = next(subdiagrams)
+                v = subdiagram.toVoronoi(polygons)
+                setExactVertices(v)
+                hull = (start + subdiagram.hull).tolist()
+                v.hullChains = (monotoneChain(hull, X, Y), monotoneChain(hull[::-1], X, Y))
+                return v
+            halfLen = len(polygons)//2
+            vL = solve(polygons[:halfLen], level+1, start)
+            vR = solve(polygons[halfLen:], level+1, start+halfLen)
+            return mergeVoronoi(polygons, vL, vR, sites, observer, scale, profile, level)
+        return solve(P, 0, 0)
+
+
+def toPolygon(p) -> Voronoi.Polygon:
+    ''' A Point or an (x, y) pair as a new Polygon, a Polygon as is '''
+    if isinstance(p, Voronoi.Polygon):
+        return p
+    if isinstance(p, Point):
+        return Voronoi.Polygon(p.x, p.y)
+    return Voronoi.Polygon(p[0], p[1])
+
+
+def removeByIndex(items: list, index: Optional[dict], item) -> dict:
+    '''
+    Remove 'item' from 'items' in O(1) by moving the last one into its place.
+    'index' maps id() to the position in 'items',
+    it is rebuilt when out of date, e.g. after save() sorted the list.
+
+    return the index
+    '''
+    i = None if index is None else index.get(id(item))
+    if i is None or i >= len(items) or items[i] is not item:
+        index = {id(x): j for j, x in enumerate(items)}
+        i = index[id(item)]
+    del index[id(item)]
+    last = items.pop()
+    if last is not item:
+        items[i] = last
+        index[id(last)] = i
+    return index
+
+
+def exactCoordinatesOf(v: Voronoi, p: Point, rescale=True) -> Optional[Tuple[int, int]]:
+    '''
+    'p' on the scale of exactX, exactY of the sites of 'v'.
+    If 'p' needs a finer scale, every site of 'v' is scaled up first when 'rescale',
+    otherwise None is returned.
+    '''
+    if v.scale is None:
+        v.scale = setExactCoordinates(v.P)
+    scale = v.scale
+    for a in (p.x, p.y):
+        if type(a) is not int:
+            scale = lcm(scale, Fraction(a).denominator)
+    if scale != v.scale:
+        if not rescale:
+            return None
+        factor = scale//v.scale
+        for q in v.P:
+            q.exactX *= factor
+            q.exactY *= factor
+        v.scale = scale
+    if type(p.x) is int and type(p.y) is int:
+        return p.x*scale, p.y*scale
+    return int(Fraction(p.x)*scale), int(Fraction(p.y)*scale)
+
+
+def otherPolygon(e: Voronoi.Edge, p: Voronoi.Polygon) -> Voronoi.Polygon:
+    return e.rightPolygon if e.leftPolygon is p else e.leftPolygon
+
+
+def nearestSite(v: Voronoi, X: int, Y: int) -> Voronoi.Polygon:
+    '''
+    The site of 'v' nearest to (X, Y), given on the exact scale.
+
+    Walks from site to site, always to a closer neighbor:
+    a point out of the cell of a site is closer to one of its neighbors.
+    About sqrt(n) sites are visited instead of all n.
+    '''
+    p = v.P[0]
+    d = (p.exactX - X)**2 + (p.exactY - Y)**2
+    while True:
+        for e in p.incidentEdges:
+            c = otherPolygon(e, p)
+            dc = (c.exactX - X)**2 + (c.exactY - Y)**2
+            if dc < d:
+                p = c
+                d = dc
+                break
         else:
-            resultCount -= 1
+            return p
 
-    return ccwP[:resultCount]
+
+def bisectorExtent(L: Voronoi.Polygon, R: Voronoi.Polygon, candidates: List[Voronoi.Polygon]):
+    '''
+    The part of the bisector of L and R that no site of 'candidates' is closer to,
+    exact on exactX, exactY.
+    The bisector is X(t) = (L+R)/2 + t*w, w = (R-L) rotated by +90 degrees:
+    the direction from startVertex to endVertex of an Edge with L on its left.
+
+    return (lower, upper), each bound as (numerator, denominator, the site it is from)
+    of t = numerator/denominator, or None for infinity.
+    return None if nothing or only a single point is left.
+    '''
+    wX = L.exactY - R.exactY
+    wY = R.exactX - L.exactX
+    lower = upper = None
+    for k in candidates:
+        # |X(t)-k|^2 - |X(t)-L|^2 = n - 2*t*q
+        kX = k.exactX - L.exactX
+        kY = k.exactY - L.exactY
+        q = wX*kX + wY*kY
+        n = kX*(k.exactX - R.exactX) + kY*(k.exactY - R.exactY)
+        if q > 0:
+            if upper is None or n*upper[1] < upper[0]*2*q:
+                upper = (n, 2*q, k)
+        elif q < 0:
+            if lower is None or n*lower[1] < lower[0]*2*q:
+                lower = (-n, -2*q, k)
+        elif n < 0:
+            # k lies between L and R
+            return None
+    if lower is not None and upper is not None and lower[0]*upper[1] >= upper[0]*lower[1]:
+        return None
+    return lower, upper
+
+
+def infiniteBounds(v: Voronoi) -> Tuple[float, float, float, float]:
+    ''' v.bounds, set to rayBounds() of the sites if not set up yet, as after CompactVoronoi.toVoronoi() '''
+    if v.bounds is None:
+        v.bounds = rayBounds(np.array([(p.x, p.y) for p in v.P], np.float64).reshape([len(v.P), 2]))
+    return v.bounds
+
+
+def setEdgeExtent(e: Voronoi.Edge, lower, upper, scale, vertices: dict, bounds: Tuple[float, float, float, float]):
+    '''
+    Move the ends of 'e' to the bounds returned by bisectorExtent().
+
+    'vertices': (x, y) -> finite Vertex, so that a Voronoi vertex stays a single shared object.
+    A bound is rounded the same way as by _voronoi(), so the same vertex gives the same key.
+    An infinite end is kept as is unless the other end has moved, then it is put on 'bounds'
+    like placeInfiniteEnds() does.
+    '''
+    L = e.leftPolygon
+    R = e.rightPolygon
+    wX = L.exactY - R.exactY
+    wY = R.exactX - L.exactX
+
+    def vertexAt(bound):
+        num, den, _ = bound
+        x = ((L.exactX + R.exactX)*den + 2*num*wX) / (2*den*scale)
+        y = ((L.exactY + R.exactY)*den + 2*num*wY) / (2*den*scale)
+        vertex = vertices.get((x, y))
+        if vertex is None:
+            vertex = vertices[(x, y)] = Voronoi.Vertex(x, y, e)
+        return vertex
+    oldStart = e.startVertex
+    oldEnd = e.endVertex
+    start = vertexAt(lower) if lower is not None else None
+    end = vertexAt(upper) if upper is not None else None
+
+    isMoved = False
+    if start is None:
+        if oldStart is not None and oldStart.isInfinite and end is oldEnd:
+            start = oldStart
+        else:
+            start = Voronoi.Vertex(0, 0, e, isInfinite=True)
+            isMoved = True
+    if end is None:
+        if oldEnd is not None and oldEnd.isInfinite and start is oldStart:
+            end = oldEnd
+        else:
+            end = Voronoi.Vertex(0, 0, e, isInfinite=True)
+            isMoved = True
+    e.startVertex = start
+    e.endVertex = end
+    if isMoved:
+        setInfiniteEnds(e, bounds)
 
 
-def getCrossEdges(points: list) -> Tuple[Optional[List[Point]]]:
+def linkEdges(edges):
     '''
-    An Edge is returned left first as: [LeftPoint, RightPoint]
+    Set cwPredecessor, ccwPredecessor (at startVertex) and cwSuccessor, ccwSuccessor (at endVertex)
+    of 'edges' from the incident edges of their Polygons, None at an infinite end.
     '''
-    i = 0
-    crossEdgeTop = None
-    crossEdgeBottom = None
+    def edgeAt(e: Voronoi.Edge, p: Voronoi.Polygon, vertex: Voronoi.Vertex):
+        ''' The other edge of the cell of 'p' meeting 'e' at 'vertex' '''
+        if vertex.isInfinite:
+            return None
+        for f in p.incidentEdges:
+            if f is e:
+                continue
+            for u in (f.startVertex, f.endVertex):
+                if u is vertex or (not u.isInfinite and u.x == vertex.x and u.y == vertex.y):
+                    return f
+        return None
+    for e in edges:
+        e.ccwPredecessor = edgeAt(e, e.leftPolygon, e.startVertex)
+        e.cwPredecessor = edgeAt(e, e.rightPolygon, e.startVertex)
+        e.cwSuccessor = edgeAt(e, e.leftPolygon, e.endVertex)
+        e.ccwSuccessor = edgeAt(e, e.rightPolygon, e.endVertex)
+        e.startVertex.edge = e
+        e.endVertex.edge = e
+
+
+def repairCells(v: Voronoi, sites: List[Voronoi.Polygon]):
+    ''' Update Polygon.edge, the edge links and the convex hull around 'sites' '''
+    edges = {}
+    for p in sites:
+        p.edge = p.incidentEdges[0] if len(p.incidentEdges) > 0 else None
+        for e in p.incidentEdges:
+            edges[id(e)] = e
+    linkEdges(edges.values())
+    if v.hull is None:
+        return
+    # The sites on the convex hull are the ones with an unbounded cell
+    for p in sites:
+        i = bisect_left(v.hull, p)
+        isOnHull = i < len(v.hull) and v.hull[i] is p
+        isUnbounded = len(p.incidentEdges) == 0 or any(
+            e.startVertex.isInfinite or e.endVertex.isInfinite for e in p.incidentEdges)
+        if isUnbounded and not isOnHull:
+            v.hull.insert(i, p)
+        elif isOnHull and not isUnbounded:
+            del v.hull[i]
+
+
+def insertSite(v: Voronoi, site) -> Voronoi.Polygon:
+    '''
+    Voronoi.insert()
 
-    def checkCrossEdge(A: Voronoi.Polygon, B: Voronoi.Polygon):
-        nonlocal crossEdgeTop, crossEdgeBottom
-        if A.isLeft != B.isLeft:
-            crossEdgeBottom = crossEdgeTop
-            if A.isLeft:
-                crossEdgeTop = [A, B]
+    The new cell is cut out of the cells of its neighbors, nothing else changes:
+    only the edges between two neighbors are trimmed or deleted,
+    then an edge to every neighbor is added.
+    '''
+    s = toPolygon(site)
+    s.exactX, s.exactY = exactCoordinatesOf(v, s)
+    if len(v.P) > 0:
+        nearest = nearestSite(v, s.exactX, s.exactY)
+        if nearest.exactX == s.exactX and nearest.exactY == s.exactY:
+            return nearest
+    s.incidentEdges = []
+    s.edge = None
+    if len(v.P) == 0:
+        v.addSite(s)
+        v.hull = [s]
+        return s
+
+    # The neighbors of s, walking out from the nearest site
+    # with the part of the bisector in their current cells
+    neighbors = []
+    visited = {id(nearest)}
+    stack = [nearest]
+    while len(stack) > 0:
+        c = stack.pop()
+        extent = bisectorExtent(s, c, [otherPolygon(e, c) for e in c.incidentEdges])
+        if extent is None:
+            continue
+        neighbors.append((c, extent))
+        for e in c.incidentEdges:
+            x = otherPolygon(e, c)
+            if id(x) not in visited:
+                visited.add(id(x))
+                stack.append(x)
+    isNeighbor = {id(c) for c, _ in neighbors}
+    bounds = infiniteBounds(v)
+
+    vertices = {}
+    for c, _ in neighbors:
+        for e in c.incidentEdges:
+            for u in (e.startVertex, e.endVertex):
+                if not u.isInfinite:
+                    vertices[(u.x, u.y)] = u
+
+    # The part closer to s is cut off the edges between two neighbors
+    isDone = set()
+    for c, _ in neighbors:
+        for e in c.incidentEdges.copy():
+            if id(e) in isDone or id(otherPolygon(e, c)) not in isNeighbor:
+                continue
+            isDone.add(id(e))
+            L = e.leftPolygon
+            extent = bisectorExtent(L, e.rightPolygon,
+                                    [otherPolygon(f, L) for f in L.incidentEdges if f is not e] + [s])
+            if extent is None:
+                v.discardEdge(e)
             else:
-                crossEdgeTop = [B, A]
-
-    last = len(points)-1
-    for i in range(last):
-        checkCrossEdge(points[i], points[i+1])
-    checkCrossEdge(points[0], points[last])
-
-    if crossEdgeTop == crossEdgeBottom:
-        crossEdgeBottom = crossEdgeTop
-
-    return crossEdgeTop, crossEdgeBottom
-
-
-def leftTop(points):
-    ''' leftMost_thenTopMost '''
-    ''' smallest x then bigger y '''
-    l = points[0]
-    l: Voronoi.Polygon
-    p: Voronoi.Polygon
-    for p in points[1:]:
-        if p.x < l.x:
-            l = p
-        elif p.x == l.x:
-            if p.y > l.y:
-                l = p
-    return l
-
-
-class WorkerThread(QThread):
-    canvasUpdate = pyqtSignal()
-    clearCanvas = pyqtSignal()
-    drawPoints = pyqtSignal(list)
-    drawPolygon = pyqtSignal(list, QColor)
-    drawVoronoiOrEdges = pyqtSignal(object, QColor, int)
-    drawEdge = pyqtSignal(object, QColor, int, object)
-
-    def __init__(self, canvas: Canvas):
-        super(WorkerThread, self).__init__()
-        self.num = 0
-        self.polygons = []
-        self.canvas = canvas
-        self.firstDraw = True
-        self.voronoiResult = None
-
-    def run(self, *args, **kwargs):
-        if len(sys.argv) > 1:
-            try:
-                with open(sys.argv[1], 'r', errors='ignore') as f:
-                    if f.read(1) == 'P':
-                        f.seek(0)
-                        p = []
-                        edges = []
-                        for line in f.readlines():
-                            words = line.split()
-                            if len(words) >= 3:
-                                if words[0] == 'P':
-                                    p.append(Voronoi.Polygon(
-                                        int(words[1]), int(words[2])))
-                                else:
-                                    e = Voronoi.Edge()
-                                    e.startVertex = Point(
-                                        float(words[1]), float(words[2]))
-                                    e.endVertex = Point(
-                                        float(words[3]), float(words[4]))
-                                    edges.append(e)
-                        self.voronoiResult = Voronoi(p, edges)
-                        self.drawVoronoiOrEdges.emit(
-                            self.voronoiResult, GRAY, 4)
-                        return
-                    else:
-                        f.seek(0)
-                        n = 0
-                        iP = 0
-                        for line in f.readlines():
-                            iSharp = line.find('#')
-                            if iSharp == 0:
-                                continue
-                            if iSharp > 0:
-                                line = line[:iSharp]
-                            words = line.split()
-                            if len(words) == 0:
-                                continue
-
-                            # Done Extracting words, it should be like:
-                            #   words = ['2']
-                            #   words = ['100', '200']
-
-                            if iP >= n:
-                                n = int(words[0])
-                                if n == 0:
-                                    break
-                                # P = np.zeros([n, 2], dtype=np.float32)
-                                self.polygons = []
-                                iP = 0
-                                continue
-
-                            x, y = int(words[0]), int(words[1])
-                            # P[iP] = [x,y]
-                            self.polygons.append(Voronoi.Polygon(x, y))
-                            iP += 1
-
-                            if iP >= n:
-                                # if self.polygons is not None:
-                                if DEBUG:
-                                    print(
-                                        '\nn =', n, '---------------------------------------------------------')
-                                    print(self.polygons)
-                                if self.firstDraw:
-                                    self.firstDraw = False
-                                else:
-                                    self.canvas.waitNext()
-                                self.voronoi(self.polygons)
-            except Exception as e:
-                print(traceback.format_exc())
-                pass
-            self.canvas.polygons = self.polygons
-        while True:
-            self.canvas.setMode(Canvas.Mode.AddPoint)
-            self.canvas.waitNext()
-            self.polygons = self.canvas.polygons.copy()
-            n = len(self.polygons)
-            if DEBUG:
-                print(
-                    '\nn =', n, '---------------------------------------------------------')
-                print(self.polygons)
-            self.voronoi(self.polygons)
+                setEdgeExtent(e, *extent, v.scale, vertices, bounds)
 
-    def voronoi(self, P: List[Voronoi.Polygon]) -> Voronoi:
-        ''' Wrapper function '''
+    for c, (lower, upper) in neighbors:
+        e = Voronoi.Edge()
+        e.leftPolygon = s
+        e.rightPolygon = c
+        setEdgeExtent(e, lower, upper, v.scale, vertices, bounds)
+        e.attach()
+        v.addEdge(e)
 
-        if P is None or len(P) <= 0:
-            return
+    v.addSite(s)
+    repairCells(v, [s] + [c for c, _ in neighbors])
+    return s
 
-        # sort by __lt__
-        # sort small x first, then big y first
-        P.sort()
 
-        countNoDuplicate = 1
-        for i in range(1, len(P)):
-            if P[i] != P[countNoDuplicate-1]:
-                P[countNoDuplicate] = P[i]
-                countNoDuplicate += 1
-        P = P[:countNoDuplicate]
-        # print('After Dedup:', P)
+def removeSite(v: Voronoi, site) -> Voronoi.Polygon:
+    '''
+    Voronoi.remove()
 
-        self.clearCanvas.emit()
-        self.drawPoints.emit(self.polygons)
-        try:
-            self.voronoiResult = self._voronoi(P)
-        except Exception as e:
-            print(traceback.format_exc())
-            self.canvas.waitStep()
+    The cell of the site is shared by its neighbors:
+    only the edges between two of them are added or extended.
+    '''
+    exact = exactCoordinatesOf(v, toPolygon(site), rescale=False) if len(v.P) > 0 else None
+    p = None
+    if exact is not None:
+        p = nearestSite(v, *exact)
+        if (p.exactX, p.exactY) != exact or (isinstance(site, Voronoi.Polygon) and p is not site):
+            p = None
+    if p is None:
+        raise ValueError(f'{site} is not a site of the Voronoi diagram')
+
+    neighbors = [otherPolygon(e, p) for e in p.incidentEdges]
+    for e in p.incidentEdges.copy():
+        v.discardEdge(e)
+    p.edge = None
+    v.discardSite(p)
+    if v.hull is not None:
+        i = bisect_left(v.hull, p)
+        if i < len(v.hull) and v.hull[i] is p:
+            del v.hull[i]
+    bounds = infiniteBounds(v)
+
+    vertices = {}
+    for c in neighbors:
+        for e in c.incidentEdges:
+            for u in (e.startVertex, e.endVertex):
+                if not u.isInfinite:
+                    vertices[(u.x, u.y)] = u
+
+    # The new neighbors of c are among its old ones and the other neighbors of p
+    for i, c in enumerate(neighbors):
+        for x in neighbors[i+1:]:
+            e = None
+            for f in c.incidentEdges:
+                if otherPolygon(f, c) is x:
+                    e = f
+                    break
+            L, R = (e.leftPolygon, e.rightPolygon) if e is not None else (c, x)
+            candidates = {id(k): k for k in neighbors}
+            for f in L.incidentEdges:
+                k = otherPolygon(f, L)
+                candidates[id(k)] = k
+            del candidates[id(L)]
+            del candidates[id(R)]
+            extent = bisectorExtent(L, R, candidates.values())
+            if extent is None:
+                if e is not None:
+                    v.discardEdge(e)
+                continue
+            if e is None:
+                e = Voronoi.Edge()
+                e.leftPolygon = L
+                e.rightPolygon = R
+                e.attach()
+                v.addEdge(e)
+            setEdgeExtent(e, *extent, v.scale, vertices, bounds)
 
-    def _voronoi(self, polygons: List[Voronoi.Polygon]) -> Voronoi:
-        '''
-        P should be already sorted,
-        and No duplicate Polygons allowed
-        '''
-        # if len(P) <= 0: # should not happen
-        #     print('should not happen')
-        #     return
-        if len(polygons) == 1:
-            return Voronoi(polygons)
-        halfLen = len(polygons)//2
-        vL = self._voronoi(polygons[:halfLen])
-        vR = self._voronoi(polygons[halfLen:])
-        for e in vL.edges:
-            e.intersected = False
-        for e in vR.edges:
-            e.intersected = False
-        chL = vL.P
-        chR = vR.P
-        for p in chL:
-            p.isLeft = True
-        for p in chR:
-            p.isLeft = False
-        # self.drawPolygon.emit(chL)
-        # self.drawPolygon.emit(chR)
-        lt = leftTop(chL)
-        # print('\nLT = ',lt)
-        ch = GrahamScan(lt, chL + chR)
-        crossEdgeTop, crossEdgeBottom = getCrossEdges(ch)
-
-        self.canvas.waitStep()
-        self.clearCanvas.emit()
-        self.drawEdge.emit(crossEdgeBottom, PURPLE, 4, Qt.PenStyle.DotLine)
-        self.drawEdge.emit(crossEdgeTop, RED, 4, Qt.PenStyle.DotLine)
-        self.drawPoints.emit(self.polygons)
-        self.drawVoronoiOrEdges.emit(vL, BLUE, 4)
-        self.drawVoronoiOrEdges.emit(vR, PURPLE, 4)
-        # self.drawPolygon.emit(ch, BLUE)
-        self.canvas.waitStep()
-        intersection: Voronoi.Edge.Intersection = None
+    repairCells(v, neighbors)
+    return p
+
+
+def _voronoi(polygons: List[Voronoi.Polygon], observer: Optional[MergeObserver] = None, scale=1,
+             profile: Optional[MergeProfile] = None, level=0, sites: Optional[tuple] = None, start=0) -> Voronoi:
+    '''
+    P should be already sorted,
+    and No duplicate Polygons allowed.
+    'scale' is returned by setExactCoordinates()
+    'level': of the recursion, 0 at the top
+    'sites': (P, exactX, exactY) of all the sites, made once at the top: the convex hulls are merged
+    as indices of them, see mergeConvexHulls()
+    'start': the index of polygons[0] in 'sites'
+
+    Every decision of the merge is made by exact integer predicates on the sites (exactX, exactY).
+    Vertex coordinates are only rounded at the end of each computation and never fed back,
+    so there is no threshold to tune and no "intersection is None".
+    '''
+    # if len(P) <= 0: # should not happen
+    #     print('should not happen')
+    #     return
+    if len(polygons) == 1:
+        # The Polygon may be reused from an earlier run
+        polygons[0].incidentEdges = []
+        if level == 0:
+            return Voronoi(polygons, hull=polygons.copy())
+        v = Voronoi(polygons)
+        v.hullChains = ([start], [start])
+        return v
+    if sites is None:
+        sites = siteArrays(polygons)
+    halfLen = len(polygons)//2
+    vL = _voronoi(polygons[:halfLen], observer, scale, profile, level+1, sites, start)
+    vR = _voronoi(polygons[halfLen:], observer, scale, profile, level+1, sites, start+halfLen)
+    return mergeVoronoi(polygons, vL, vR, sites, observer, scale, profile, level)
+
+
+def _voronoiCollinear(polygons: List[Voronoi.Polygon]) -> Voronoi:
+    '''
+    _voronoi() of sorted sites on one line, in O(n) with no merge:
+    the bisectors of the neighbors, parallel and infinite both ways.
+    '''
+    for p in polygons:
+        p.incidentEdges = []
+    edges = []
+    for l, r in zip(polygons, polygons[1:]):
         bisector = Voronoi.Edge()
-        HP: List[Voronoi.Edge] = []
+        bisector.leftPolygon = l
+        bisector.rightPolygon = r
+        # compute() puts the infinite ends on its bounds
+        centerX = (r.x + l.x)/2
+        centerY = (r.y + l.y)/2
+        vectorX = -(r.y - l.y)
+        vectorY = r.x - l.x
+        bisector.startVertex = Voronoi.Vertex(centerX-vectorX, centerY-vectorY, bisector, isInfinite=True)
+        bisector.endVertex = Voronoi.Vertex(centerX+vectorX, centerY+vectorY, bisector, isInfinite=True)
+        if l.edge is None:
+            l.edge = bisector
+        if r.edge is None:
+            r.edge = bisector
+        bisector.attach()
+        edges.append(bisector)
+    return Voronoi(polygons, edges, hull=polygons.copy())
+
+
+def mergeVoronoi(polygons: List[Voronoi.Polygon], vL: Voronoi, vR: Voronoi, sites: tuple,
+                 observer: Optional[MergeObserver] = None, scale=1,
+                 profile: Optional[MergeProfile] = None, level=0) -> Voronoi:
+    '''
+    Merge the diagrams of the left and the right half of 'polygons' along HP.
+    vL and vR are consumed.
+    'sites': (P, exactX, exactY) of all the sites, that Voronoi.hullChains index, see _voronoi()
+    '''
+    if profile is not None:
+        hullStart = time.perf_counter()
+    allSites, X, Y = sites
+    lower, upper = mergeConvexHulls(vL.hullChains, vR.hullChains, X, Y)
+    top, bottom = getCrossEdges(lower, upper, vR.hullChains[0][0])
+    crossEdgeTop = [allSites[i] for i in top]
+    crossEdgeBottom = [allSites[i] for i in bottom]
+    # Length of the fake infinite ends, only drawn by an observer: compute() puts them on its bounds at the end
+    rayLength = 2*max(allSites[lower[-1]].x - allSites[lower[0]].x,
+                      max(allSites[i].y for i in upper) - min(allSites[i].y for i in lower), WIN_SIZE)
+    if profile is not None:
+        hullSeconds = time.perf_counter() - hullStart
+
+    if observer is not None:
+        observer.crossEdges(vL, vR, crossEdgeTop, crossEdgeBottom)
+    if profile is not None:
+        hyperplaneStart = time.perf_counter()
+    # Edges looked at for the exits of HP
+    exitScans = 0
+    intersectionVertex: Voronoi.Vertex = None
+    bisector = Voronoi.Edge()
+    HP: List[Voronoi.Edge] = []
+    if DEBUG:
+        print(polygons)
+
+    # The cells HP goes through: [Polygon, entry edge, exit edge], None for infinity
+    leftCrossed = [[crossEdgeTop[0], None, None]]
+    rightCrossed = [[crossEdgeTop[1], None, None]]
+    # Edges of vL and vR that HP cuts
+    trimmedEdges: List[Voronoi.Edge] = []
+    while True:
+        bisector.leftPolygon, bisector.rightPolygon = crossEdgeTop
+        l: Voronoi.Polygon = bisector.leftPolygon
+        r: Voronoi.Polygon = bisector.rightPolygon
+        center: Point = (r+l)/2
+        vector: Point = (r-l)
+        vector.x, vector.y = -vector.y, vector.x
+        a = ceil(rayLength/vector.norm())
+        vector *= a
+        if intersectionVertex is None:
+            bisector.startVertex = Voronoi.Vertex(
+                center.x-vector.x, center.y-vector.y, bisector, isInfinite=True)
+            bisector.endVertex = Voronoi.Vertex(
+                center.x+vector.x, center.y+vector.y, bisector, isInfinite=True)
+        else:
+            bisector.startVertex = Voronoi.Vertex(
+                intersectionVertex.x-vector.x, intersectionVertex.y-vector.y, bisector, isInfinite=True)
+            bisector.endVertex = intersectionVertex
+
         if DEBUG:
-            print(polygons)
-        while True:
-            bisector.leftPolygon, bisector.rightPolygon = crossEdgeTop
-            center: Point = (bisector.rightPolygon+bisector.leftPolygon)/2
-            vector: Point = (bisector.rightPolygon-bisector.leftPolygon)
-            vector.x, vector.y = -vector.y, vector.x
-            a = ceil(WIN_SIZE*2/vector.norm())
-            vector *= a
-            if intersection is None:
-                bisector.startVertex = Voronoi.Vertex(
-                    center.x-vector.x, center.y-vector.y, bisector, isInfinite=True)
-                bisector.endVertex = Voronoi.Vertex(
-                    center.x+vector.x, center.y+vector.y, bisector, isInfinite=True)
+            print('crossEdgeTop', crossEdgeTop)
+            print('  bisector.leftPolygon', bisector.leftPolygon)
+            print('  bisector.rightPolygon', bisector.rightPolygon)
+            print('  center', center)
+            print('  vector', vector)
+            print('  bisector', bisector)
+        HP.append(bisector)
+
+        # bisector has angle in range [0, 180)
+        # (include angle 0 but not angle 180)
+
+        def setBisectorPolygonEdge():
+            if bisector.leftPolygon.edge is None:
+                bisector.leftPolygon.edge = bisector
+            if bisector.rightPolygon.edge is None:
+                bisector.rightPolygon.edge = bisector
+        setBisectorPolygonEdge()
+
+        leftPolygonEdges = l.edges()
+        rightPolygonEdges = r.edges()
+        if observer is not None:
+            # Copies: the observer may draw them later, from another thread, while the merge goes on
+            observer.hyperplaneStep(vL, vR, list(HP), list(crossEdgeTop), list(crossEdgeBottom),
+                                    list(leftPolygonEdges), list(rightPolygonEdges))
+        if crossEdgeTop[0] is crossEdgeBottom[0] and crossEdgeTop[1] is crossEdgeBottom[1]:
+            break
+        exitScans += len(leftPolygonEdges) + len(rightPolygonEdges)
+
+        # Walking down the bisector, X(s) = (l+r)/2 + s*down.
+        # X(s) stays in the cell of l (in vL) while it is not closer to any neighbor c of l:
+        #   s <= (c-l)·(c-r) / (2 down·(c-l))    if down·(c-l) > 0
+        # and the same goes for r (in vR) with down·(c-r).
+        # HP leaves at the smallest bound: exact rational comparisons on integers.
+        downX = r.exactY - l.exactY
+        downY = l.exactX - r.exactX
+
+        def findExit(site: Voronoi.Polygon, edges: List[Voronoi.Edge], isLeft):
+            '''
+            return (numerator, denominator, edge, neighbor) of the smallest bound,
+            None if HP never leaves the cell of 'site'
+            '''
+            best = None
+            for e in edges:
+                c = e.rightPolygon if e.leftPolygon is site else e.leftPolygon
+                cx = c.exactX - site.exactX
+                cy = c.exactY - site.exactY
+                q = downX*cx + downY*cy
+                if q <= 0:
+                    continue
+                n = (c.exactX - l.exactX)*(c.exactX - r.exactX) + \
+                    (c.exactY - l.exactY)*(c.exactY - r.exactY)
+                if best is not None:
+                    bound = n*best[1]
+                    bestBound = best[0]*q
+                    if bound > bestBound:
+                        continue
+                    if bound == bestBound:
+                        # Cocircular: take the neighbor the next bisector would not leave right away
+                        b: Voronoi.Polygon = best[3]
+                        if isLeft:
+                            nextDownX, nextDownY = r.exactY - b.exactY, b.exactX - r.exactX
+                        else:
+                            nextDownX, nextDownY = b.exactY - l.exactY, l.exactX - b.exactX
+                        if nextDownX*(c.exactX - b.exactX) + nextDownY*(c.exactY - b.exactY) <= 0:
+                            continue
+                best = (n, q, e, c)
+            return best
+        leftExit = findExit(l, leftPolygonEdges, isLeft=True)
+        rightExit = findExit(r, rightPolygonEdges, isLeft=False)
+        if leftExit is not None and rightExit is not None:
+            leftBound = leftExit[0]*rightExit[1]
+            rightBound = rightExit[0]*leftExit[1]
+            if leftBound < rightBound:
+                rightExit = None
+            elif leftBound > rightBound:
+                leftExit = None
+            # else: both at the same vertex
+        if leftExit is None and rightExit is None:
+            # Only if the input breaks the assumptions of _voronoi
+            if DEBUG:
+                print('ERROR: intersection is None')
+            if observer is not None:
+                observer.intersectionNotFound()
+            break
+        n, q, _, _ = leftExit or rightExit
+        # Round once, from the exact rational
+        X = (l.exactX + r.exactX)*q + n*downX
+        Y = (l.exactY + r.exactY)*q + n*downY
+        intersectionVertex = Voronoi.Vertex(X / (2*q*scale), Y / (2*q*scale), bisector, isInfinite=False)
+        intersectionVertex.exact = (X, Y, 2*q)
+        if observer is not None:
+            observer.intersection(intersectionVertex)
+
+        if bisector.endVertex.isInfinite:
+            bisector.endVertex.x = intersectionVertex.x+vector.x
+            bisector.endVertex.y = intersectionVertex.y+vector.y
+        elif isSameVertex(bisector.endVertex, intersectionVertex):
+            # Zero length: 4 or more cocircular sites
+            HP.pop()
+            intersectionVertex = bisector.endVertex
+        bisector.startVertex = intersectionVertex
+        nextBisector = Voronoi.Edge()
+        bisector.ccwPredecessor = nextBisector
+        bisector.cwPredecessor = nextBisector
+        for exit, crossed, isLeft in ((leftExit, leftCrossed, True), (rightExit, rightCrossed, False)):
+            if exit is None:
+                continue
+            _, _, edgeQ, c = exit
+            edgeQ: Voronoi.Edge
+            # The part of edgeQ closer to the other side is cut off.
+            # Along edgeQ (start -> end), the direction is (B-A) rotated by +90 degrees
+            A = edgeQ.leftPolygon
+            B = edgeQ.rightPolygon
+            other = r if isLeft else l
+            site = l if isLeft else r
+            isEndCut = (A.exactY - B.exactY)*(other.exactX - site.exactX) + \
+                (B.exactX - A.exactX)*(other.exactY - site.exactY) > 0
+            # A fake infinite end that is left goes on from the new finite end
+            rayX = A.y - B.y
+            rayY = B.x - A.x
+            a = ceil(rayLength/sqrt(rayX**2 + rayY**2))
+            if isLeft:
+                bisector.ccwPredecessor = edgeQ
+            else:
+                bisector.cwPredecessor = edgeQ
+            if isEndCut:
+                edgeQ.endVertex = intersectionVertex
+                if edgeQ.startVertex.isInfinite:
+                    edgeQ.startVertex.x = intersectionVertex.x - a*rayX
+                    edgeQ.startVertex.y = intersectionVertex.y - a*rayY
+                if isLeft:
+                    edgeQ.cwSuccessor = bisector
+                    edgeQ.ccwSuccessor = nextBisector
+                else:
+                    edgeQ.ccwSuccessor = bisector
+                    edgeQ.cwSuccessor = nextBisector
             else:
-                startVertex1 = Voronoi.Vertex(
-                    intersection.x-vector.x, intersection.y-vector.y, bisector, isInfinite=True)
-                startVertex2 = Voronoi.Vertex(
-                    center.x-vector.x, center.y-vector.y, bisector, isInfinite=True)
-                if startVertex1.lessThan_yFirst(startVertex2):
-                    bisector.startVertex = startVertex1
+                edgeQ.startVertex = intersectionVertex
+                if edgeQ.endVertex.isInfinite:
+                    edgeQ.endVertex.x = intersectionVertex.x + a*rayX
+                    edgeQ.endVertex.y = intersectionVertex.y + a*rayY
+                if isLeft:
+                    edgeQ.cwPredecessor = bisector
+                    edgeQ.ccwPredecessor = nextBisector
                 else:
-                    bisector.startVertex = startVertex2
+                    edgeQ.ccwPredecessor = bisector
+                    edgeQ.cwPredecessor = nextBisector
+            trimmedEdges.append(edgeQ)
+
+            crossed[-1][2] = edgeQ
+            crossed.append([c, edgeQ, None])
+            if isLeft:
+                crossEdgeTop[0] = c
+            else:
+                crossEdgeTop[1] = c
+
+        bisector = nextBisector
+
+    if profile is not None:
+        hyperplaneSeconds = time.perf_counter() - hyperplaneStart
+    if observer is not None:
+        observer.hyperplaneDone(Voronoi(polygons, vL.edges+HP+vR.edges))
+    if profile is not None:
+        deletionStart = time.perf_counter()
+
+    # Delete the edges on the other side of HP.
+    # In a cell HP goes through, they are the neighbors between the exit and the entry edges,
+    # ccw for a left cell, cw for a right cell.  Exact, and only the crossed cells are visited.
+    # HP comes from infinity going down the first bisector and leaves along the last one.
+    lTop = leftCrossed[0][0]
+    rTop = rightCrossed[0][0]
+    infiniteEntry = (lTop.exactY - rTop.exactY, rTop.exactX - lTop.exactX)  # upward
+    infiniteExit = (r.exactY - l.exactY, l.exactX - r.exactX)  # downward
+
+    deletedEdges = {}
+    # Incident edges looked at
+    deletionScans = 0
+    for crossed, isLeft in ((leftCrossed, True), (rightCrossed, False)):
+        for site, entry, exit in crossed:
+            def direction(e: Optional[Voronoi.Edge], infinite):
+                if e is None:
+                    return infinite
+                c = e.rightPolygon if e.leftPolygon is site else e.leftPolygon
+                return (c.exactX - site.exactX, c.exactY - site.exactY)
+            P = direction(entry, infiniteEntry)
+            Q = direction(exit, infiniteExit)
+            if not isLeft:
+                P, Q = Q, P
+            # HP enters and leaves through the same edge:
+            # only the sliver along that edge is left of the cell
+            isSliver = entry is not None and entry is exit
+            deletionScans += len(site.incidentEdges)
+            for e in site.incidentEdges:
+                if e is entry or e is exit:
+                    continue
+                c = e.rightPolygon if e.leftPolygon is site else e.leftPolygon
+                if isSliver or isCcwBetween(Q, (c.exactX - site.exactX, c.exactY - site.exactY), P):
+                    deletedEdges[id(e)] = e
+    # HP may go right through a vertex and leave nothing of a cut edge
+    for e in trimmedEdges:
+        if not e.startVertex.isInfinite and not e.endVertex.isInfinite and \
+                isSameVertex(e.startVertex, e.endVertex):
+            deletedEdges[id(e)] = e
+    for e in deletedEdges.values():
+        if DEBUG:
+            print('  Delete Edge', e)
+        e.detach()
+    deletedEdge = len(deletedEdges) > 0
+    if deletedEdge:
+        vL.edges = [e for e in vL.edges if id(e) not in deletedEdges]
+        vR.edges = [e for e in vR.edges if id(e) not in deletedEdges]
+
+    for hp in HP:
+        hp.attach()
+
+    if level == 0:
+        hull = [allSites[i] for i in sorted(set(lower + upper))]
+        v = Voronoi(polygons, vL.edges+HP+vR.edges, hull)
+    else:
+        v = Voronoi(polygons, vL.edges+HP+vR.edges)
+        v.hullChains = (lower, upper)
+    if profile is not None:
+        hullSites = sum(len(chain) for chain in vL.hullChains + vR.hullChains)
+        profile.add(level, sites=len(polygons), hullSeconds=hullSeconds, hullSites=hullSites,
+                    hyperplaneSeconds=hyperplaneSeconds, bisectors=len(HP), exitScans=exitScans,
+                    deletionSeconds=time.perf_counter() - deletionStart, deletionScans=deletionScans,
+                    deletedEdges=len(deletedEdges))
+    if deletedEdge and observer is not None:
+        observer.edgesDeleted(v)
+    return v
+
+
+def readChunks(f, chunkSize: int) -> Iterator[np.ndarray]:
+    '''
+    Read the binary file object 'f' about 'chunkSize' bytes at a time,
+    yield writable uint8 arrays of whole lines, each ends with a newline.
+    '''
+    rest = b''
+    while True:
+        data = f.read(chunkSize)
+        if len(data) == 0:
+            if len(rest) > 0:
+                yield np.frombuffer(bytearray(rest + b'\n'), np.uint8)
+            return
+        data = rest + data
+        cut = data.rfind(b'\n') + 1
+        rest = data[cut:]
+        if cut > 0:
+            yield np.frombuffer(bytearray(data[:cut]), np.uint8)
 
-                bisector.endVertex = Voronoi.Vertex(
-                    intersection.x, intersection.y, bisector, isInfinite=False)
 
-            if DEBUG:
-                print('crossEdgeTop', crossEdgeTop)
-                print('  bisector.leftPolygon', bisector.leftPolygon)
-                print('  bisector.rightPolygon', bisector.rightPolygon)
-                print('  center', center)
-                print('  vector', vector)
-                print('  bisector', bisector)
-            HP.append(bisector)
-
-            # bisector has angle in range [0, 180)
-            # (include angle 0 but not angle 180)
-
-            def setBisectorPolygonEdge():
-                if bisector.leftPolygon.edge is None:
-                    bisector.leftPolygon.edge = bisector
-                if bisector.rightPolygon.edge is None:
-                    bisector.rightPolygon.edge = bisector
-            setBisectorPolygonEdge()
-
-            leftPolygonEdges = bisector.leftPolygon.edges(vL)
-            rightPolygonEdges = bisector.rightPolygon.edges(vR)
-            self.clearCanvas.emit()
-            self.drawEdge.emit(crossEdgeBottom, PURPLE,
-                               4, Qt.PenStyle.DotLine)
-            self.drawEdge.emit(crossEdgeTop, RED, 4, Qt.PenStyle.DotLine)
-            self.drawPoints.emit(self.polygons)
-            self.drawVoronoiOrEdges.emit(vL, BLUE, 4)
-            self.drawVoronoiOrEdges.emit(vR, PURPLE, 4)
-            self.drawVoronoiOrEdges.emit(HP, RED, 4)
-            self.drawVoronoiOrEdges.emit(leftPolygonEdges, GREEN, 8)
-            self.drawVoronoiOrEdges.emit(rightPolygonEdges, LIGHT_GREEN, 4)
-            if crossEdgeTop == crossEdgeBottom:
-                break
+def lineIndices(chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ''' (the line of every byte of 'chunk', the newline belongs to the line it ends; isNewline) '''
+    isNewline = chunk == ord('\n')
+    return np.cumsum(isNewline) - isNewline, isNewline
 
-            def lessThan(a: Point, b: Point):
-                return a.y < b.y or (a.y == b.y and a.x < b.x)
-
-            oldIntersection = intersection
-            intersection: Voronoi.Edge.Intersection = None
-
-            def findMaxIntersection(edges: List[Voronoi.Edge], isLeft):
-                nonlocal intersection, oldIntersection
-                if DEBUG:
-                    if isLeft:
-                        print('  left edges', edges)
-                    else:
-                        print('  right edges', edges)
-                for e in edges:
-                    # if e.intersected:
-                    #     continue
-                    if oldIntersection is not None:
-                        if e is oldIntersection.edgeP:
-                            continue
-                        if e is oldIntersection.edgeQ:
-                            continue
-                    _intersection = bisector.intersection(e)
-                    # if p is e: # collinear.  Should not happen if all points has different coordinate
-                    #     continue
-                    if _intersection is None or _intersection is bisector:
-                        continue
 
-                    newCrossEdgeTop = crossEdgeTop.copy()
-                    if isLeft:
-                        if crossEdgeTop[0] is _intersection.edgeQ.leftPolygon:
-                            newCrossEdgeTop[0] = _intersection.edgeQ.rightPolygon
-                        else:
-                            newCrossEdgeTop[0] = _intersection.edgeQ.leftPolygon
-                    else:
-                        if crossEdgeTop[1] is _intersection.edgeQ.leftPolygon:
-                            newCrossEdgeTop[1] = _intersection.edgeQ.rightPolygon
-                        else:
-                            newCrossEdgeTop[1] = _intersection.edgeQ.leftPolygon
+def tokenStarts(chunk: np.ndarray) -> np.ndarray:
+    ''' Is every byte of 'chunk' the first one of a whitespace separated token '''
+    isSpace = np.isin(chunk, np.frombuffer(b' \t\n\r\v\f', np.uint8))
+    return ~isSpace & np.concatenate([[True], isSpace[:-1]])
 
-                    # newCrossEdgeTop must move downward
-                    if isLeft:
-                        if ccw(crossEdgeTop[0], crossEdgeTop[1], newCrossEdgeTop[0]) > 0:
-                            continue
-                    else:
-                        if ccw(crossEdgeTop[0], crossEdgeTop[1], newCrossEdgeTop[1]) > 0:
-                            continue
 
-                    # not working
-                    # is_duplicated_crossEdgeTop = False
-                    # for hp in HP:
-                    #     if hp.leftPolygon is newCrossEdgeTop[0] and hp.rightPolygon is newCrossEdgeTop[1]:
-                    #         is_duplicated_crossEdgeTop = True
-                    #         break
-                    # if is_duplicated_crossEdgeTop:
-                    #     continue
-
-                    def max(a: Point, b: Point):
-                        if a is None:
-                            return b
-                        # if b is None:
-                        #     return a
-                        if lessThan(a, b):
-                            return b
-                        return a
-
-                    _intersection.isLeft = isLeft
-                    intersection = max(intersection, _intersection)
-            findMaxIntersection(leftPolygonEdges, isLeft=True)
-            findMaxIntersection(rightPolygonEdges, isLeft=False)
-            if intersection is None:
-                if DEBUG:
-                    print('ERROR: intersection is None')
-                    self.canvas.waitNext()
+def parseNumbers(chunk: np.ndarray, dtype) -> np.ndarray:
+    '''
+    The whitespace separated numbers of 'chunk', anything else must be blanked out already.
+    raise ValueError if a token is not a number: fromstring() would stop there silently
+    '''
+    nTokens = int(np.count_nonzero(tokenStarts(chunk)))
+    if nTokens == 0:
+        # fromstring() takes a blank text as a single 0
+        return np.empty(0, dtype)
+    numbers = np.fromstring(chunk.tobytes(), dtype, sep=' ')
+    if len(numbers) != nTokens:
+        raise ValueError(f'Not a number after {len(numbers)} numbers of a chunk')
+    if np.dtype(dtype).kind in 'iu':
+        limits = np.iinfo(dtype)
+        if np.any((numbers == limits.max) | (numbers == limits.min)):
+            # fromstring() saturates integers out of range, Python ints are exact: an object array then
+            return np.array([int(token) for token in chunk.tobytes().split()], object)
+    return numbers
+
+
+def readCases(f, chunkSize: int = 1 << 22) -> Iterator[np.ndarray]:
+    '''
+    Yield the cases of the multi-case test data in the binary file object 'f' one by one,
+    as int64 arrays of shape [n, 2], object arrays of Python ints when their chunk has numbers out of the int64 range.
+    A case is a line with the number of points n, then n lines of "x y".
+    '#' starts a comment, n = 0 ends the data.
+    raise ValueError if a token is not an integer, a count is negative or the last case is cut short.
+
+    The file is read in chunks that NumPy parses as a whole, no object is made per line or point.
+    '''
+    parts = []
+    nNumbers = 0
+    nNeeded = 1  # to yield the next case or stop
+    for chunk in readChunks(f, chunkSize):
+        hashes = np.flatnonzero(chunk == ord('#'))
+        if len(hashes) > 0:
+            # Blank out from the first '#' of a line to its end
+            lineOf, isNewline = lineIndices(chunk)
+            firstHash = np.full(lineOf[-1] + 1, len(chunk))
+            lines, iFirst = np.unique(lineOf[hashes], return_index=True)
+            firstHash[lines] = hashes[iFirst]
+            chunk[(np.arange(len(chunk)) >= firstHash[lineOf]) & ~isNewline] = ord(' ')
+        numbers = parseNumbers(chunk, np.int64)
+        parts.append(numbers)
+        nNumbers += len(numbers)
+        if nNumbers < nNeeded:
+            continue
+
+        # Only the numbers matter: a count, then 2*count coordinates
+        numbers = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        i = 0
+        while True:
+            if i >= len(numbers):
+                nNeeded = 1
+                break
+            n = int(numbers[i])
+            if n == 0:
+                return
+            if n < 0:
+                raise ValueError(f'Negative number of points {n}')
+            if i + 1 + 2*n > len(numbers):
+                nNeeded = 1 + 2*n
                 break
+            yield numbers[i+1:i+1+2*n].reshape([n, 2])
+            i += 1 + 2*n
+        parts = [numbers[i:]]
+        nNumbers = len(parts[0])
+    if nNumbers > 0:
+        n = int(parts[0][0])
+        raise ValueError(f'The last case has {(nNumbers - 1)//2} of its {n} points')
 
-            intersection.edgeQ.intersected = True
-            if DEBUG:
-                print('  edgeQ.leftPolygon', intersection.edgeQ.leftPolygon)
-                print('  edgeQ.rightPolygon', intersection.edgeQ.rightPolygon)
-            self.drawPolygon.emit([intersection], RED)
-            self.canvas.waitStep()
 
-            bisector.startVertex = Voronoi.Vertex(
-                intersection.x, intersection.y, bisector.startVertex, isInfinite=False)
-            if bisector.endVertex.isInfinite:
-                if bisector.endVertex.lessThan_yFirst(intersection):
-                    bisector.endVertex.x = intersection.x+vector.x
-                    bisector.endVertex.y = intersection.y+vector.y
-            nextBisector = Voronoi.Edge()
-            if intersection.isLeft:
-                bisector.ccwPredecessor = intersection.edgeQ
-                bisector.cwPredecessor = nextBisector
-                if intersection.rs < 0:
-                    intersection.edgeQ.endVertex = Voronoi.Vertex(
-                        intersection.x, intersection.y, intersection.edgeQ, isInfinite=False)
-                    if intersection.u < 0:
-                        intersection.edgeQ.startVertex += floor(
-                            intersection.u-1)*intersection.s
-                    intersection.edgeQ.cwSuccessor = bisector
-                    intersection.edgeQ.ccwSuccessor = nextBisector
-                else:
-                    intersection.edgeQ.startVertex = Voronoi.Vertex(
-                        intersection.x, intersection.y, intersection.edgeQ, isInfinite=False)
-                    if intersection.u > 1:
-                        intersection.edgeQ.endVertex += ceil(
-                            intersection.u)*intersection.s
-                    intersection.edgeQ.cwPredecessor = bisector
-                    intersection.edgeQ.ccwPredecessor = nextBisector
-                if crossEdgeTop[0] is intersection.edgeQ.leftPolygon:
-                    crossEdgeTop[0] = intersection.edgeQ.rightPolygon
-                else:
-                    crossEdgeTop[0] = intersection.edgeQ.leftPolygon
-            else:
-                bisector.cwPredecessor = intersection.edgeQ
-                bisector.ccwPredecessor = nextBisector
-                if intersection.rs > 0:
-                    intersection.edgeQ.endVertex = Voronoi.Vertex(
-                        intersection.x, intersection.y, intersection.edgeQ, isInfinite=False)
-                    if intersection.u < 0:
-                        intersection.edgeQ.startVertex += floor(
-                            intersection.u-1)*intersection.s
-                    intersection.edgeQ.ccwSuccessor = bisector
-                    intersection.edgeQ.cwSuccessor = nextBisector
-                else:
-                    intersection.edgeQ.startVertex = Voronoi.Vertex(
-                        intersection.x, intersection.y, intersection.edgeQ, isInfinite=False)
-                    if intersection.u > 1:
-                        intersection.edgeQ.endVertex += ceil(
-                            intersection.u)*intersection.s
-                    intersection.edgeQ.ccwPredecessor = bisector
-                    intersection.edgeQ.cwPredecessor = nextBisector
-                if crossEdgeTop[1] is intersection.edgeQ.leftPolygon:
-                    crossEdgeTop[1] = intersection.edgeQ.rightPolygon
-                else:
-                    crossEdgeTop[1] = intersection.edgeQ.leftPolygon
+def readResults(f, chunkSize: int = 1 << 22) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    '''
+    Yield the results in the save() format ("P x y" and "E x1 y1 x2 y2" lines) of the binary file object 'f'
+    one by one, in chunks like readCases(), other lines are ignored.
+    In a batch() output, a "C case nSites" line starts every result, a file without one is a single result.
+    raise ValueError if a P, E or C line does not have 2, 4 or 2 numbers,
+    or a result does not have the nSites of its C line.
+
+    yield (sites [nSites, 2], edges [nEdges, 4]),
+    sites are int64 if all of them are integers, the rest is float64
+    '''
+    def result():
+        allSites = np.concatenate(sites) if len(sites) > 0 else np.empty([0, 2])
+        allEdges = np.concatenate(edges) if len(edges) > 0 else np.empty([0, 4])
+        if nSites is not None and len(allSites) != nSites:
+            raise ValueError(f'{len(allSites)} P lines in case {case} of {nSites} sites')
+        if np.all(allSites == np.floor(allSites)):
+            allSites = allSites.astype(np.int64)
+        return allSites, allEdges
+
+    sites = []
+    edges = []
+    # Of the last C line, None before any
+    case = nSites = None
+    for chunk in readChunks(f, chunkSize):
+        lineOf, isNewline = lineIndices(chunk)
+        starts = np.concatenate([[0], np.flatnonzero(isNewline[:-1]) + 1])
+        isP = chunk[starts] == ord('P')
+        isE = chunk[starts] == ord('E')
+        isC = chunk[starts] == ord('C')
+        isRecord = isP | isE | isC
+        chunk[~isRecord[lineOf] & ~isNewline] = ord(' ')
+        chunk[starts[isRecord]] = ord(' ')
+        numbers = parseNumbers(chunk, np.float64)
+
+        # Where the numbers of every record start
+        counts = np.where(isE, 4, 2)[isRecord]
+        nTokens = np.bincount(lineOf[tokenStarts(chunk)], minlength=len(starts))[isRecord]
+        if np.any(nTokens != counts):
+            bad = np.argmax(nTokens != counts)
+            raise ValueError(f'{nTokens[bad]} numbers instead of {counts[bad]} in a P, E or C line')
+        offsets = np.cumsum(counts) - counts
+        isP = isP[isRecord]
+        isE = isE[isRecord]
+        iP = np.flatnonzero(isP)
+        iE = np.flatnonzero(isE)
+        chunkSites = numbers[offsets[iP][:, None] + np.arange(2)]
+        chunkEdges = numbers[offsets[iE][:, None] + np.arange(4)]
+
+        # The records of a result end at the next C line
+        iC = np.flatnonzero(isC[isRecord])
+        cuts = np.concatenate([[0], iC, [len(counts)]])
+        siteCuts = np.searchsorted(iP, cuts)
+        edgeCuts = np.searchsorted(iE, cuts)
+        for k in range(len(cuts) - 1):
+            if k > 0:
+                if case is not None or len(sites) > 0 or len(edges) > 0:
+                    yield result()
+                sites = []
+                edges = []
+                case, nSites = (int(a) for a in numbers[offsets[iC[k-1]]:offsets[iC[k-1]]+2])
+            if siteCuts[k] < siteCuts[k+1]:
+                sites.append(chunkSites[siteCuts[k]:siteCuts[k+1]])
+            if edgeCuts[k] < edgeCuts[k+1]:
+                edges.append(chunkEdges[edgeCuts[k]:edgeCuts[k+1]])
+    yield result()
+
+
+def readResult(f, chunkSize: int = 1 << 22, case: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    The result in the save() format of the binary file object 'f', see readResults().
+    'case': which result of a batch() output, from 0.  None if 'f' has a single result,
+    ValueError otherwise, or if there is no such case.
+    '''
+    results = readResults(f, chunkSize)
+    if case is not None:
+        for i, result in enumerate(results):
+            if i == case:
+                return result
+        raise ValueError(f'No result {case}')
+    result = next(results)
+    if next(results, None) is not None:
+        raise ValueError('Several results, read one of them with readResult(f, case=...) or readResults(f)')
+    return result
 
-            oldBisector = bisector
-            bisector = nextBisector
 
-        v = Voronoi(polygons, vL.edges+HP+vR.edges)
-        self.canvas.waitHP()
-        self.clearCanvas.emit()
-        self.drawPoints.emit(self.polygons)
-        self.drawVoronoiOrEdges.emit(v, GRAY, 4)
-
-        def isOfHP(vertex, isLeft):
-            for hp in HP:
-                if vertex.y > hp.endVertex.y+PRECISION and not hp.endVertex.isInfinite:
-                    return False
-                if vertex.y >= hp.startVertex.y or hp.startVertex.isInfinite:
-                    _ccw = ccw(hp.startVertex, hp.endVertex, vertex)
-                    if (isLeft and _ccw > PRECISION) or (not isLeft and _ccw < -PRECISION):
-                        if DEBUG:
-                            if isLeft:
-                                print('  Delete Left Edge')
-                            else:
-                                print('  Delete Right Edge')
-                            print('    hp.startVertex.isInfinite',
-                                  hp.startVertex.isInfinite)
-                            print('    hp.startVertex', hp.startVertex)
-                            print('    hp.endVertex', hp.endVertex)
-                            print('    vertex', vertex)
-                            print('    ccw', _ccw)
-                        return True
-            return False
-        deletedEdge = False
-        count = 0
-        for e in vL.edges:
-            e: Voronoi.Edge
-            if isOfHP(e.startVertex, isLeft=False):
-                deletedEdge = True
-                continue
-            if isOfHP(e.endVertex, isLeft=False):
-                deletedEdge = True
-                continue
-            vL.edges[count] = e
-            count += 1
-        vL.edges = vL.edges[:count]
-
-        count = 0
-        for e in vR.edges:
-            e: Voronoi.Edge
-            if isOfHP(e.startVertex, isLeft=True):
-                deletedEdge = True
-                continue
-            if isOfHP(e.endVertex, isLeft=True):
-                deletedEdge = True
-                continue
-            vR.edges[count] = e
-            count += 1
-        vR.edges = vR.edges[:count]
-
-        if deletedEdge:
-            v = Voronoi(polygons, vL.edges+HP+vR.edges)
-            self.canvas.waitStep()
-            self.clearCanvas.emit()
-            self.drawPoints.emit(self.polygons)
-            self.drawVoronoiOrEdges.emit(v, GRAY, 4)
-        return v
+def loadResult(fname) -> Tuple[np.ndarray, np.ndarray]:
+    ''' (sites [nSites, 2], edges [nEdges, 4]) of a binary or text save() file '''
+    with open(fname, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            f.seek(0)
+            return readResult(f)
+    v = CompactVoronoi.load(fname)
+    return v.sites, v.edgeCoordinates()
 
 
-if __name__ == '__main__':
-    def main():
-        global DEBUG
-        for argv in sys.argv:
-            if argv == '-debug':
-                DEBUG = True
-                break
-        app = QApplication(sys.argv[:1])
-        window = MainWindow()
-        window.show()
-        app.exec_()
+def solveCases(cases: List[np.ndarray]) -> List[Tuple[str, float, int]]:
+    '''
+    Run in a worker process of batch(): the save() text, the seconds of compute()
+    and the number of sites without duplicates for every case
+    '''
+    results = []
+    for points in cases:
+        start = time.perf_counter()
+        v = compute(points)
+        seconds = time.perf_counter() - start
+        f = io.StringIO()
+        if v is not None:
+            v.write(f)
+        results.append((f.getvalue(), seconds, 0 if v is None else len(v.P)))
+    return results
+
+
+def batch(fnameIn, fnameOut, processes: Optional[int] = None, timing=None, casesPerTask=16) -> int:
+    '''
+    Solve every case of the test data file 'fnameIn' on a pool of 'processes' worker processes
+    (one per core by default), and write the results in the save() format to 'fnameOut', in input order,
+    each after a "C case nSites" line (case from 1, nSites without duplicates), see readResults().
+
+    The cases are read only as the workers need them: a few tasks of 'casesPerTask' cases
+    per process are queued at a time, so the file may be of any size.
+    'timing': a text file object to write "case points seconds" for every case to.
 
-    main()
+    return the number of cases
+    '''
+    if processes is None:
+        processes = os.cpu_count() or 1
+    nCases = 0
+    with open(fnameIn, 'rb') as fIn, open(fnameOut, 'w') as fOut, \
+            multiprocessing.Pool(processes) as pool:
+        cases = readCases(fIn)
+        pending = deque()
+
+        def submit():
+            chunk = list(islice(cases, casesPerTask))
+            if len(chunk) > 0:
+                pending.append(([len(points) for points in chunk],
+                                pool.apply_async(solveCases, (chunk,))))
+        for _ in range(processes*4):
+            submit()
+        while len(pending) > 0:
+            nPoints, result = pending.popleft()
+            submit()
+            for n, (text, seconds, nSites) in zip(nPoints, result.get()):
+                nCases += 1
+                fOut.write(f'C {nCases} {nSites}\n')
+                fOut.write(text)
+                if timing is not None:
+                    timing.write(f'{nCases} {n} {seconds:.6f}\n')
+    return nCases
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[1] == '-batch':
+        # python voronoi.py -batch input.txt output.txt [processes]
+        start = time.perf_counter()
+        nCases = batch(sys.argv[2], sys.argv[3],
+                       int(sys.argv[4]) if len(sys.argv) > 4 else None, timing=sys.stdout)
+        print(f'{nCases} cases in {time.perf_counter() - start:.3f} s')
+    elif len(sys.argv) >= 3 and sys.argv[1] == '-profile':
+        # python voronoi.py -profile input.txt
+        with open(sys.argv[2], 'rb') as f:
+            for i, points in enumerate(readCases(f)):
+                profile = MergeProfile()
+                start = time.perf_counter()
+                compute(points, profile=profile)
+                print(f'case {i + 1}: {len(points)} points in {time.perf_counter() - start:.3f} s')
+                print(profile)
+    elif len(sys.argv) >= 4 and sys.argv[1] == '-png':
+        # python voronoi.py -png result.txt tile_{row}_{column}.png [scale] [tileSize]
+        # Needs PyQt5 but no display
+        from voronoi_gui import exportTiles
+        sites, edges = loadResult(sys.argv[2])
+        fnames = exportTiles(sites, edges, sys.argv[3],
+                             float(sys.argv[4]) if len(sys.argv) > 4 else 1.0,
+                             int(sys.argv[5]) if len(sys.argv) > 5 else 1024)
+        print(f'{len(fnames)} tiles')
+    else:
+        # The GUI lives in its own module, so importing this one never loads PyQt5
+        from voronoi_gui import main
+        main()
@@ -0,0 +1,1132 @@
+# $LAN=PYTHON$
+
+# Voronoi Diagram
+# Python 3.9.5
+
+# By Jahhow Tu 涂家浩 -> https://www.facebook.com/TUJAHHOW
+# M103040005 TU CHIA HAO
+
+
+import sys
+from typing import List, Optional, Tuple, Union
+from math import sqrt
+import numpy as np
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+import traceback
+import voronoi
+from voronoi import WIN_SIZE, Point, Voronoi, MergeObserver, CompactVoronoi, compute, readCases, readResult
+
+GRAY = QColor('#777')
+RED = QColor('#f54242')
+LIGHT_GREEN = QColor('#c0eb34')
+GREEN = QColor('#00cf0a')
+BLUE = QColor('#007bff')
+PURPLE = QColor('#b434eb')
+
+# Up to this many points added or removed since the last diagram are applied to it one by one
+MAX_INCREMENTAL_POINTS = 16
+
+POINT_RADIUS = 4
+
+# Zoom factor of a mouse wheel notch
+ZOOM_STEP = 1.25
+
+
+def siteCoordinates(points: List[Point]) -> np.ndarray:
+    ''' [n, 2] float64 '''
+    return np.array([(p.x, p.y) for p in points], np.float64).reshape([len(points), 2])
+
+
+def edgeCoordinates(edges: List[Voronoi.Edge]) -> np.ndarray:
+    ''' [n, 4] float64, (start.x, start.y, end.x, end.y) '''
+    return np.array([(e.startVertex.x, e.startVertex.y, e.endVertex.x, e.endVertex.y) for e in edges],
+                    np.float64).reshape([len(edges), 4])
+
+
+def toPolygonF(xy: np.ndarray) -> QPolygonF:
+    ''' Fill a QPolygonF through its buffer instead of making a QPointF per point '''
+    polygon = QPolygonF(len(xy))
+    if len(xy) > 0:
+        buffer = polygon.data()
+        buffer.setsize(xy.size*np.dtype(np.float64).itemsize)
+        np.frombuffer(buffer, np.float64).reshape(xy.shape)[:] = xy
+    return polygon
+
+
+# QDataStream version edgePath() reads with.  Its QPainterPath layout, checked against Qt 5.15:
+# the element count (int32), (type int32, x double, y double) per element with 0 for MoveTo and 1 for LineTo,
+# then cStart (int32, where the last subpath starts) and the fill rule (int32, 0 for OddEvenFill), big-endian.
+PATH_STREAM_VERSION = QDataStream.Qt_5_0
+# Does the layout above hold for the Qt in use, see isPathStreamLayout()
+pathStreamLayout = None
+
+
+def pathStreamBytes(lines: np.ndarray) -> bytes:
+    ''' One subpath per line of [n, 4] n > 0, in the QPainterPath layout of PATH_STREAM_VERSION '''
+    elements = np.empty(2*len(lines), [('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+    elements['type'] = np.tile([0, 1], len(lines))
+    elements['x'] = lines[:, 0::2].ravel()
+    elements['y'] = lines[:, 1::2].ravel()
+    return np.array([len(elements)], '>i4').tobytes() + elements.tobytes() + \
+        np.array([len(elements)-2, 0], '>i4').tobytes()
+
+
+def isPathStreamLayout() -> bool:
+    ''' Does Qt write a path made by moveTo() and lineTo() the same as pathStreamBytes(), checked once '''
+    global pathStreamLayout
+    if pathStreamLayout is None:
+        lines = np.array([[0.5, 1, 2, 3], [-4, 5.25, 6, -7]])
+        path = QPainterPath()
+        for x1, y1, x2, y2 in lines.tolist():
+            path.moveTo(x1, y1)
+            path.lineTo(x2, y2)
+        data = QByteArray()
+        stream = QDataStream(data, QIODevice.WriteOnly)
+        stream.setVersion(PATH_STREAM_VERSION)
+        stream << path
+        pathStreamLayout = bytes(data) == pathStreamBytes(lines)
+    return pathStreamLayout
+
+
+def edgePath(lines: np.ndarray) -> QPainterPath:
+    '''
+    One subpath per line of [n, 4].  Stroked at once, faster than drawLines().
+    Read from pathStreamBytes() in one go instead of a moveTo() and a lineTo() per line,
+    unless the Qt in use streams paths differently.
+    '''
+    path = QPainterPath()
+    if len(lines) == 0:
+        return path
+    if not isPathStreamLayout():
+        for x1, y1, x2, y2 in lines.tolist():
+            path.moveTo(x1, y1)
+            path.lineTo(x2, y2)
+        return path
+    stream = QDataStream(QByteArray(pathStreamBytes(lines)))
+    stream.setVersion(PATH_STREAM_VERSION)
+    stream >> path
+    return path
+
+
+def clipLines(lines: np.ndarray, xMin, yMin, xMax, yMax) -> np.ndarray:
+    '''
+    Liang-Barsky on every line of [n, 4] at once, the lines outside the rectangle are dropped.
+    Keeps the far ends of infinite edges out of the rasterizer when zoomed in.
+    '''
+    x1, y1, x2, y2 = lines.T
+    dx = x2-x1
+    dy = y2-y1
+    t0 = np.zeros(len(lines))
+    t1 = np.ones(len(lines))
+    inside = np.ones(len(lines), bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x1-xMin), (dx, xMax-x1), (-dy, y1-yMin), (dy, yMax-y1)):
+            inside &= (p != 0) | (q >= 0)
+            r = q/p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    inside &= t0 <= t1
+    t0 = t0[inside, None]
+    t1 = t1[inside, None]
+    start = lines[inside, :2]
+    d = lines[inside, 2:]-start
+    return np.hstack([start+t0*d, start+t1*d])
+
+
+def inRect(xy: np.ndarray, xMin, yMin, xMax, yMax) -> np.ndarray:
+    ''' Mask of the points of [n, 2] in the rectangle '''
+    return (xy[:, 0] >= xMin) & (xy[:, 0] <= xMax) & (xy[:, 1] >= yMin) & (xy[:, 1] <= yMax)
+
+
+def snapUnique(xy: np.ndarray, grid=1) -> np.ndarray:
+    ''' [n, 2] -> [m, 2] rounded to multiples of 'grid', one per multiple '''
+    xy = np.round(xy/grid).astype(np.int64)
+    if len(xy) == 0:
+        return xy.astype(np.float64)
+    low = xy.min(0)
+    width = int(xy[:, 0].max()-low[0])+1
+    # Sorted then compared with the next one, np.unique() is many times slower
+    keys = np.sort((xy[:, 1]-low[1])*width+xy[:, 0]-low[0])
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return np.stack([keys % width+low[0], keys//width+low[1]], 1).astype(np.float64)*grid
+
+
+def levelOfDetail(lines: np.ndarray, width, dots: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Lines of [n, 4] in pixels -> (the long lines, [m, 2] dots for the rest and the 'dots' given).
+    A line is short if it is under half the pen 'width' or a pixel, it looks like a dot anyway.
+    There is at most one dot per half a pen width.  Zoomed out, most edges of a big diagram are short.
+    '''
+    grid = max(1, width/2)
+    isShort = np.hypot(lines[:, 2]-lines[:, 0], lines[:, 3]-lines[:, 1]) < grid
+    middles = (lines[isShort, :2]+lines[isShort, 2:])/2
+    if dots is not None:
+        middles = np.vstack([middles, dots])
+    return lines[~isShort], snapUnique(middles, grid)
+
+
+class SpatialIndex:
+    '''
+    Uniform grid over the sites and the edges of a diagram, a view only looks at the cells it covers.
+
+    An edge is filed under the cell of its middle point,
+    or in a list scanned every time if it is longer than a cell, like the infinite edges.
+    Points outside the grid are filed under the nearest border cell.
+
+    For views zoomed out so far that a cell is a few pixels, there are levels of detail:
+    with grid = cellSize*2**k, the sites and the middles of the edges shorter than grid,
+    one per multiple of grid, and the edges at least grid long.
+    '''
+
+    def __init__(self, sites: np.ndarray, edges: np.ndarray) -> None:
+        ''' sites: [n, 2], edges: [m, 4] '''
+        self.sites = sites
+        self.edges = edges
+        if len(sites) > 0:
+            self.origin = sites.min(0)
+            extent = float((sites.max(0)-self.origin).max())
+        else:
+            self.origin = np.zeros(2)
+            extent = 0
+        # About 8 sites a cell
+        self.gridSize = max(1, int(sqrt(len(sites)/8)))
+        self.cellSize = (extent if extent > 0 else 1)/self.gridSize
+
+        isLong = np.maximum(np.abs(edges[:, 2]-edges[:, 0]), np.abs(edges[:, 3]-edges[:, 1])) > self.cellSize
+        self.longEdges = np.flatnonzero(isLong)
+        shortEdges = np.flatnonzero(~isLong)
+        self.edgeOrder, self.edgeStart = self.fileUnderCells(
+            (edges[shortEdges, :2]+edges[shortEdges, 2:])/2, shortEdges)
+        self.siteOrder, self.siteStart = self.fileUnderCells(sites, np.arange(len(sites)))
+
+        # Each level is made from the one before, only the edges that become short are added
+        lengths = np.hypot(edges[:, 2]-edges[:, 0], edges[:, 3]-edges[:, 1])
+        order = np.argsort(lengths)
+        lengths = lengths[order]
+        self.levels = []  # [(grid, dots, sites, long edges)] from fine to coarse
+        grid = self.cellSize
+        dots = np.empty([0, 2])
+        nShort = 0
+        while True:
+            n = np.searchsorted(lengths, grid)
+            shorter = edges[order[nShort:n]]
+            dots = snapUnique(np.vstack([dots, (shorter[:, :2]+shorter[:, 2:])/2]), grid)
+            sites = snapUnique(sites, grid)
+            nShort = n
+            self.levels.append((grid, dots, sites, order[n:]))
+            if grid >= extent:
+                break
+            grid *= 2
+
+    def cellRange(self, xy0, xy1) -> Tuple[np.ndarray, np.ndarray]:
+        ''' Column and row of the cells of xy0 and xy1, clamped into the grid '''
+        return tuple(np.clip(np.floor((np.asarray(xy, np.float64)-self.origin)/self.cellSize),
+                             0, self.gridSize-1).astype(np.int64) for xy in (xy0, xy1))
+
+    def fileUnderCells(self, xy: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ''' (indices sorted by cell, where each cell starts in them) '''
+        cells, _ = self.cellRange(xy, xy)
+        cells = cells[:, 1]*self.gridSize+cells[:, 0]
+        order = np.argsort(cells, kind='stable')
+        return indices[order], np.searchsorted(cells[order], np.arange(self.gridSize**2+1))
+
+    def lookUp(self, order: np.ndarray, start: np.ndarray, xMin, yMin, xMax, yMax) -> np.ndarray:
+        (column0, row0), (column1, row1) = self.cellRange((xMin, yMin), (xMax, yMax))
+        rows = range(row0*self.gridSize, row1*self.gridSize+1, self.gridSize)
+        return np.concatenate([order[start[row+column0]:start[row+column1+1]] for row in rows])
+
+    def levelOfDetail(self, grid):
+        ''' The coarsest level whose grid is at most 'grid', None if there is none '''
+        result = None
+        for level in self.levels:
+            if level[0] > grid:
+                break
+            result = level
+        return result
+
+    def sitesIn(self, xMin, yMin, xMax, yMax, grid=0) -> np.ndarray:
+        ''' Snapped to a grid up to 'grid' if there is a level of detail for it '''
+        level = self.levelOfDetail(grid)
+        if level is None:
+            sites = self.sites[self.lookUp(self.siteOrder, self.siteStart, xMin, yMin, xMax, yMax)]
+        else:
+            sites = level[2]
+        return sites[inRect(sites, xMin, yMin, xMax, yMax)]
+
+    def edgesIn(self, xMin, yMin, xMax, yMax, grid=0) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        (the edges whose bounding box overlaps the rectangle, [m, 2] dots).
+        If there is a level of detail for 'grid', the edges shorter than its grid are the dots.
+        '''
+        level = self.levelOfDetail(grid)
+        if level is None:
+            # The middle of a short edge touching the rectangle is at most half a cell away
+            margin = self.cellSize/2
+            edges = self.edges[np.concatenate([
+                self.lookUp(self.edgeOrder, self.edgeStart, xMin-margin, yMin-margin, xMax+margin, yMax+margin),
+                self.longEdges])]
+            dots = np.empty([0, 2])
+        else:
+            edges = self.edges[level[3]]
+            dots = level[1][inRect(level[1], xMin, yMin, xMax, yMax)]
+        x1, y1, x2, y2 = edges.T
+        return edges[(np.minimum(x1, x2) <= xMax) & (np.maximum(x1, x2) >= xMin) &
+                     (np.minimum(y1, y2) <= yMax) & (np.maximum(y1, y2) >= yMin)], dots
+
+
+class View:
+    ''' Which part of a diagram is drawn on a width x height paint device, and at what scale '''
+
+    def __init__(self, width, height, zoom=1.0, panX=0.0, panY=0.0) -> None:
+        self.width = width
+        self.height = height
+        # The diagram point at the bottom left corner, and pixels per unit
+        self.zoom = zoom
+        self.panX = panX
+        self.panY = panY
+
+    def worldTransform(self) -> QTransform:
+        ''' Diagram coordinates (y up) to pixels '''
+        return QTransform(self.zoom, 0, 0, -self.zoom, -self.panX*self.zoom, self.height+self.panY*self.zoom)
+
+    def toWorld(self, x, y) -> Tuple[float, float]:
+        ''' Pixel -> diagram coordinates '''
+        return x/self.zoom+self.panX, (self.height-y)/self.zoom+self.panY
+
+    def toPixels(self, xy: np.ndarray) -> np.ndarray:
+        ''' worldTransform() on [n, 2] or [n, 4] '''
+        pixels = np.empty_like(xy, np.float64)
+        pixels[:, 0::2] = (xy[:, 0::2]-self.panX)*self.zoom
+        pixels[:, 1::2] = self.height-(xy[:, 1::2]-self.panY)*self.zoom
+        return pixels
+
+    def viewRect(self, marginPixels=0) -> Tuple[float, float, float, float]:
+        ''' (xMin, yMin, xMax, yMax) of the diagram in view '''
+        xMin, yMax = self.toWorld(-marginPixels, -marginPixels)
+        xMax, yMin = self.toWorld(self.width+marginPixels, self.height+marginPixels)
+        return xMin, yMin, xMax, yMax
+
+    def sitesInView(self, sites: np.ndarray) -> QPolygonF:
+        '''
+        In pixels, at most one per pixel.
+        When the circles would cover the view many times over, at most one per half a radius.
+        '''
+        sites = sites[inRect(sites, *self.viewRect(POINT_RADIUS))]
+        grid = 1 if len(sites) <= self.width*self.height/POINT_RADIUS**2 else POINT_RADIUS/2
+        return toPolygonF(snapUnique(self.toPixels(sites), grid))
+
+    def linesInView(self, lines: np.ndarray, width, dots: Optional[np.ndarray] = None) \
+            -> Tuple[QPainterPath, QPolygonF]:
+        ''' (the path of the long lines, the dots of the short ones and 'dots') in pixels '''
+        # Clipped after telling the short lines, so that a line cut by the border stays a line
+        lines, dots = levelOfDetail(self.toPixels(lines), width, None if dots is None else self.toPixels(dots))
+        return edgePath(clipLines(lines, -width, -width, self.width+width, self.height+width)), toPolygonF(dots)
+
+    def indexInView(self, index: SpatialIndex, width) -> Tuple[QPolygonF, QPainterPath, QPolygonF]:
+        ''' sitesInView() and linesInView() of what 'index' has in view '''
+        # Levels of detail finer than the snapping of sitesInView() and linesInView()
+        sites = index.sitesIn(*self.viewRect(POINT_RADIUS), 1/self.zoom)
+        lines, dots = index.edgesIn(*self.viewRect(width), max(1, width/2)/self.zoom)
+        return (self.sitesInView(sites), *self.linesInView(lines, width, dots))
+
+
+def paintSites(device: QPaintDevice, sites: QPolygonF, qcolor, offset=(0.0, 0.0)):
+    ''' 'offset': in pixels, added to 'sites' by the painter '''
+    painter = QPainter(device)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.translate(*offset)
+
+    # A round point as wide as the circle, all of them in one call
+    p = painter.pen()
+    p.setWidth(2*POINT_RADIUS)
+    p.setColor(qcolor)
+    p.setCapStyle(Qt.PenCapStyle.RoundCap)
+    painter.setPen(p)
+    painter.drawPoints(sites)
+
+    painter.end()
+
+
+def paintLines(device: QPaintDevice, path: QPainterPath, dots: QPolygonF, qcolor, width, offset=(0.0, 0.0)):
+    ''' 'offset' as for paintSites() '''
+    painter = QPainter(device)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.translate(*offset)
+    p = painter.pen()
+    p.setWidth(width)
+    p.setColor(qcolor)
+    painter.setPen(p)
+    painter.drawPath(path)
+    painter.drawPoints(dots)
+    painter.end()
+
+
+def exportTiles(sites: np.ndarray, edges: np.ndarray, fnamePattern='tile_{row}_{column}.png', scale=1.0,
+                tileSize=1024, bounds: Optional[Tuple[float, float, float, float]] = None,
+                qcolor=GRAY, width=4) -> List[str]:
+    '''
+    Draw a diagram off-screen into PNG tiles, without a display or a QApplication.
+
+    sites: [n, 2], edges: [m, 4], e.g. siteCoordinates(v.P) and edgeCoordinates(v.edges) or loadResult()
+    fnamePattern: formatted with the row (from the top) and the column of each tile
+    scale: pixels per unit of the diagram
+    bounds: (xMin, yMin, xMax, yMax) to draw, the sites padded by 5% by default
+
+    One tile is in memory at a time, and only what is in it is drawn, looked up in a SpatialIndex.
+    return the file names, row by row
+    '''
+    xMin, yMin, xMax, yMax = voronoi.paddedBounds(sites) if bounds is None else bounds
+    imageWidth = max(1, int(np.ceil((xMax-xMin)*scale)))
+    imageHeight = max(1, int(np.ceil((yMax-yMin)*scale)))
+
+    index = SpatialIndex(np.asarray(sites, np.float64), np.asarray(edges, np.float64))
+    fnames = []
+    for row in range(0, (imageHeight+tileSize-1)//tileSize):
+        for column in range(0, (imageWidth+tileSize-1)//tileSize):
+            tileWidth = min(tileSize, imageWidth-column*tileSize)
+            tileHeight = min(tileSize, imageHeight-row*tileSize)
+            view = View(tileWidth, tileHeight, scale,
+                        xMin+column*tileSize/scale, yMax-(row*tileSize+tileHeight)/scale)
+            sitesInTile, path, dots = view.indexInView(index, width)
+
+            image = QImage(tileWidth, tileHeight, QImage.Format.Format_ARGB32_Premultiplied)
+            image.fill(Qt.GlobalColor.transparent)
+            paintSites(image, sitesInTile, qcolor)
+            paintLines(image, path, dots, qcolor, width)
+            fname = fnamePattern.format(row=row, column=column)
+            if not image.save(fname, 'PNG'):
+                raise OSError(f'Cannot write {fname}')
+            fnames.append(fname)
+    return fnames
+
+
+class Canvas(QLabel):
+    STEP_MS = 200
+
+    def __init__(self):
+        super().__init__()
+        self.polygons = []
+
+        self.mutex = QMutex()
+        self.waitCondition = QWaitCondition()
+        self.stepByStep = True
+        self.continueUntilHP = False
+        self.stepMs = Canvas.STEP_MS
+
+        self.setMinimumSize(WIN_SIZE, WIN_SIZE)
+        self.curX = self.curY = None
+        self.ctrl = False
+
+        self.last_x, self.last_y = None, None
+        self.pen_color = GRAY
+
+        # View: the diagram point at the bottom left corner, and pixels per unit
+        self.panX = self.panY = 0.0
+        self.zoom = 1.0
+        self.panFrom = None
+
+        # (voronoi, voronoi.version, SpatialIndex) of the last drawn result
+        self.resultIndex = None
+        # (zoom, pen width, (xMin, yMin, xMax, yMax), View, *View.indexInView()) for that result,
+        # what is around the view is drawn too so that a pan or a resize is only a translation
+        self.resultView = None
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAlignment(Qt.AlignTop)
+
+        if len(sys.argv) > 1:
+            self.setMode(self.Mode.FreeDraw)
+        else:
+            self.setMode(self.Mode.AddPoint)
+
+        # Allow resize smaller than content pixmap
+        sizePolicy = self.sizePolicy()
+        sizePolicy.setVerticalPolicy(QSizePolicy.Ignored)
+        sizePolicy.setHorizontalPolicy(QSizePolicy.Ignored)
+        self.setSizePolicy(sizePolicy)
+
+        # setFocus to receive keypress
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setFocus()
+
+        # Thread --------------------------------------------------------
+        self.workerThread = WorkerThread(self)
+        self.workerThread.canvasUpdate.connect(self.canvasUpdate)
+        self.workerThread.clearCanvas.connect(self.clearCanvas)
+        self.workerThread.drawPoints.connect(self.drawPoints)
+        self.workerThread.drawPolygon.connect(self.drawPolygon)
+        self.workerThread.drawVoronoiOrEdges.connect(self.drawVoronoiOrEdges)
+        self.workerThread.drawEdge.connect(self.drawEdge)
+        self.workerThread.start()
+
+    def waitNext(self):
+        # if self.stepByStep:
+        # self.update()
+        self.workerThread.canvasUpdate.emit()
+        self.stepByStep = True
+        self.continueUntilHP = False
+        self.stepMs = Canvas.STEP_MS
+        self.mutex.lock()
+        self.waitCondition.wait(self.mutex)
+        self.mutex.unlock()
+
+    def waitStep(self, stepMs=None):
+        # self.update()
+        self.workerThread.canvasUpdate.emit()
+        if self.stepByStep:
+            self.mutex.lock()
+            self.waitCondition.wait(self.mutex)
+            self.mutex.unlock()
+        elif self.stepMs > 0:
+            if stepMs is None:
+                stepMs = self.stepMs
+            self.mutex.lock()
+            self.waitCondition.wait(self.mutex, stepMs)
+            self.mutex.unlock()
+
+    def waitHP(self):
+        if self.continueUntilHP:
+            self.workerThread.canvasUpdate.emit()
+            self.continueUntilHP = False
+            self.stepByStep = True
+            self.mutex.lock()
+            self.waitCondition.wait(self.mutex)
+            self.mutex.unlock()
+        else:
+            self.waitStep()
+
+    def isFastForward(self) -> bool:
+        ''' M: compute then show, nothing is drawn until the diagram is done '''
+        return not self.stepByStep and not self.continueUntilHP and self.stepMs == 0
+
+    def wakePlayCondition(self):
+        self.waitCondition.wakeOne()
+
+    def canvasUpdate(self):
+        self.update()
+
+    def clearCanvas(self):
+        # pixmap = QPixmap(self.width(), self.height())
+        # pixmap.fill(Qt.GlobalColor.transparent)
+        # self.setPixmap(pixmap)
+
+        self.pixmap().fill(Qt.GlobalColor.transparent)
+
+        # painter = QPainter(self.pixmap())
+        # painter.setCompositionMode(QPainter.CompositionMode_Source)
+        # painter.fillRect(self.rect(), Qt.GlobalColor.transparent)
+        # painter.end()
+
+    def resizeEvent(self, event):
+        if self.pixmap() is None:
+            pixmap = QPixmap(self.width(), self.height())
+            pixmap.fill(Qt.GlobalColor.transparent)
+            self.setPixmap(pixmap)
+            return
+        
+        pixmap = QPixmap(self.width(), self.height())
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter=QPainter(pixmap)
+        painter.drawPixmap(0,self.height()-self.pixmap().height(),self.pixmap())
+        painter.end()
+        self.setPixmap(pixmap)
+
+    class Mode:
+        FreeDraw = 0
+        InsertCircle = 1
+        InsertRectangle = 2
+        Crop = 3
+        AddPoint = 4
+
+    def setMode(self, mode):
+        self.mode = mode
+
+    def set_pen_color(self, c):
+        self.pen_color = QColor(c)
+
+    def view(self) -> 'View':
+        return View(self.width(), self.height(), self.zoom, self.panX, self.panY)
+
+    def resetView(self):
+        self.panX = self.panY = 0.0
+        self.zoom = 1.0
+        self.redraw()
+
+    def redraw(self):
+        ''' Draw the points and the last result again after the view changed '''
+        self.clearCanvas()
+        self.drawPoints(self.polygons)
+        if self.workerThread.voronoiResult is not None:
+            self.drawVoronoiOrEdges(self.workerThread.voronoiResult, GRAY, 4)
+        self.update()
+
+    def drawPoints(self, points: List[Point], qcolor=GRAY):
+        paintSites(self.pixmap(), self.view().sitesInView(siteCoordinates(points)), qcolor)
+
+    def drawPolygon(self, points, qcolor):
+        painter = QPainter(self.pixmap())
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        p = painter.pen()
+        p.setWidth(4)
+        p.setColor(qcolor)
+        painter.setPen(p)
+        polygon = self.view().worldTransform().map(QPolygonF([QPointF(p.x, p.y) for p in points]))
+        painter.drawPolygon(polygon)
+        p.setWidth(10)
+        painter.setPen(p)
+        painter.drawPoints(polygon)
+        painter.end()
+        # if update:
+        #     self.update()
+
+    def drawEdge(self, edge: list, qcolor, width, penStyle: Qt.PenStyle):
+        painter = QPainter(self.pixmap())
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        p = painter.pen()
+        p.setWidth(width)
+        p.setColor(qcolor)
+        p.setStyle(penStyle)
+        painter.setPen(p)
+        transform = self.view().worldTransform()
+        painter.drawLine(transform.map(QPointF(edge[0].x, edge[0].y)),
+                         transform.map(QPointF(edge[1].x, edge[1].y)))
+        painter.end()
+        # self.update()
+
+    def spatialIndex(self, v: Voronoi) -> SpatialIndex:
+        ''' Made again only after v.insert() or remove() '''
+        if self.resultIndex is None or self.resultIndex[0] is not v or self.resultIndex[1] != v.version:
+            self.resultIndex = (v, v.version, SpatialIndex(siteCoordinates(v.P), edgeCoordinates(v.edges)))
+            self.resultView = None
+        return self.resultIndex[2]
+
+    def resultInView(self, v: Voronoi, width) -> Tuple[QPolygonF, QPainterPath, QPolygonF, Tuple[float, float]]:
+        '''
+        View.indexInView() of the result and the offset to paint it at.
+        Made again only when the result, the zoom or the pen width changed,
+        or the view went out of the part drawn last time: half a view on every side of the view back then.
+        '''
+        index = self.spatialIndex(v)
+        view = self.view()
+        xMin, yMin, xMax, yMax = view.viewRect()
+        if self.resultView is None or self.resultView[:2] != (self.zoom, width) or \
+                not (self.resultView[2][0] <= xMin and self.resultView[2][1] <= yMin and
+                     xMax <= self.resultView[2][2] and yMax <= self.resultView[2][3]):
+            around = View(2*view.width, 2*view.height, self.zoom,
+                          self.panX-view.width/2/self.zoom, self.panY-view.height/2/self.zoom)
+            self.resultView = (self.zoom, width, around.viewRect(), around, *around.indexInView(index, width))
+        around = self.resultView[3]
+        # Pixels of 'around' to pixels of the view
+        offset = ((around.panX-self.panX)*self.zoom, view.height-around.height+(self.panY-around.panY)*self.zoom)
+        return (*self.resultView[4:], offset)
+
+    def drawVoronoiOrEdges(self, voronoi: Union[Voronoi, list], qcolor, width):
+        '''
+        Only what is in view, the edges shorter than a pixel as dots.
+        The finished result is looked up in its spatialIndex(),
+        a diagram in the middle of a merge is changing and is drawn from its current edges.
+        '''
+        view = self.view()
+        offset = (0.0, 0.0)
+        if isinstance(voronoi, Voronoi):
+            if voronoi is self.workerThread.voronoiResult:
+                sites, path, dots, offset = self.resultInView(voronoi, width)
+            else:
+                sites = view.sitesInView(siteCoordinates(voronoi.P))
+                path, dots = view.linesInView(edgeCoordinates(voronoi.edges), width)
+            paintSites(self.pixmap(), sites, qcolor, offset)
+        else:
+            path, dots = view.linesInView(edgeCoordinates(voronoi), width)
+        paintLines(self.pixmap(), path, dots, qcolor, width, offset)
+        # self.update()
+
+    def mUpdate(self, x, y):
+        if self.last_x is None:  # First event.
+            if self.mode != self.Mode.FreeDraw and self.mode != self.Mode.FreeDraw != self.Mode.AddPoint:
+                self.startPixmap = self.pixmap().copy()
+            self.last_x = x
+            self.last_y = y
+            return  # Ignore the first time.
+
+        # modifiers = QApplication.keyboardModifiers() # untrustable.  Use keyPressEvent instead
+        if self.mode == self.Mode.FreeDraw:
+            painter = QPainter(self.pixmap())
+            p = painter.pen()
+            p.setWidth(4)
+            p.setColor(self.pen_color)
+            painter.setPen(p)
+            painter.drawLine(self.last_x, self.last_y, x, y)
+            painter.end()
+            self.update()
+
+            # Update the origin for next time.
+            self.last_x = x
+            self.last_y = y
+        elif self.mode == self.Mode.InsertCircle:
+            pixmap = self.startPixmap.copy()
+            painter = QPainter(pixmap)
+            p = painter.pen()
+            p.setWidth(4)
+            p.setColor(self.pen_color)
+            painter.setPen(p)
+
+            if self.ctrl:
+                painter.drawEllipse(
+                    QPoint(self.last_x, self.last_y), x-self.last_x, y-self.last_y)
+            else:
+                painter.drawEllipse(self.last_x, self.last_y,
+                                    x-self.last_x, y-self.last_y)
+
+            painter.end()
+            self.setPixmap(pixmap)
+        elif self.mode == self.Mode.InsertRectangle:
+            pixmap = self.startPixmap.copy()
+            painter = QPainter(pixmap)
+            p = painter.pen()
+            p.setWidth(4)
+            p.setColor(self.pen_color)
+            painter.setPen(p)
+
+            if self.ctrl:
+                painter.drawRect(2*self.last_x-x, 2*self.last_y-y,
+                                 (x-self.last_x)*2, (y-self.last_y)*2)
+            else:
+                painter.drawRect(self.last_x, self.last_y,
+                                 x-self.last_x, y-self.last_y)
+
+            painter.end()
+            self.setPixmap(pixmap)
+        elif self.mode == self.Mode.Crop:
+            pixmap = self.startPixmap.copy()
+            painter = QPainter(pixmap)
+            # p = painter.pen()
+            # p.setWidth(4)
+            # p.setColor(Qt.GlobalColor.transparent)
+            # painter.setPen(p)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            painter.fillRect(self.last_x, self.last_y, x -
+                             self.last_x, y-self.last_y, QColor(0, 0, 0, 0))
+            # painter.setCompositionMode (QPainter::CompositionMode_SourceOver);
+
+            painter.end()
+            self.setPixmap(pixmap)
+
+    def keyPressEvent(self, event: QKeyEvent):
+        # modifiers = QApplication.keyboardModifiers() # untrustable.  Use keyPressEvent instead
+        if event.key() == Qt.Key.Key_Enter or event.key() == Qt.Key.Key_Return:
+            self.wakePlayCondition()
+            self.stepByStep = True
+            self.continueUntilHP = False
+            self.stepMs = Canvas.STEP_MS
+        elif event.key() == Qt.Key.Key_H:
+            self.stepMs = 0
+            self.stepByStep = False
+            self.continueUntilHP = True
+            self.wakePlayCondition()
+        elif event.key() == Qt.Key.Key_N:
+            if self.stepByStep:
+                self.stepMs = Canvas.STEP_MS
+                self.stepByStep = False
+                self.continueUntilHP = False
+            else:
+                self.stepMs = int(0.5 * self.stepMs)+1
+            self.wakePlayCondition()
+        elif event.key() == Qt.Key.Key_M:
+            self.stepByStep = False
+            self.continueUntilHP = False
+            self.stepMs = 0
+            self.wakePlayCondition()
+        elif event.key() == Qt.Key.Key_Backspace:
+            if self.mode == self.Mode.AddPoint:
+                if len(self.polygons) > 0:
+                    self.polygons.pop()
+                    self.clearCanvas()
+                    self.drawPoints(self.polygons)
+                    self.update()
+        elif event.key() == Qt.Key.Key_R:
+            self.resetView()
+        elif event.key() == Qt.Key.Key_0:
+            if self.mode == self.Mode.AddPoint:
+                self.polygons = []
+                self.clearCanvas()
+                self.update()
+        elif event.key() == Qt.Key.Key_S:
+            if event.modifiers() & Qt.Modifier.CTRL:
+                if self.workerThread.voronoiResult is None:
+                    print('Nothing to save.')
+                else:
+                    fname, _ = QFileDialog.getSaveFileName(
+                        self, 'Save File', '1.txt',
+                        f'Text files (*.txt);;XML files (*.xml);;Binary files (*{voronoi.BINARY_EXT})')
+                    if fname != '':
+                        self.workerThread.voronoiResult.save(fname)
+        elif event.key() == Qt.Key_Control:
+            self.ctrl = True
+        if self.curX is not None and self.last_x is not None:
+            self.mUpdate(self.curX, self.curY)
+
+    def keyReleaseEvent(self, event):
+        if event.key() == Qt.Key_Control:
+            self.ctrl = False
+        if self.curX is not None and self.last_x is not None:
+            self.mUpdate(self.curX, self.curY)
+
+    def addPoint(self, x, y, computeImmediatly=True):
+        self.polygons.append(Voronoi.Polygon(x, y))
+        if computeImmediatly:
+            self.stepByStep = False
+            self.continueUntilHP = False
+            self.stepMs = 0
+            self.wakePlayCondition()
+        else:
+            self.clearCanvas()
+            self.drawPoints(self.polygons)
+            self.update()
+
+    def mousePressEvent(self, e):
+        if e.button() == Qt.MouseButton.RightButton or e.button() == Qt.MouseButton.MiddleButton:
+            self.panFrom = e.x(), e.y()
+            return
+        if self.mode == self.Mode.AddPoint:
+            x, y = self.view().toWorld(e.x(), e.y())
+            self.addPoint(round(x), round(y))
+
+    def mouseMoveEvent(self, e):
+        if self.panFrom is not None:
+            self.panX -= (e.x()-self.panFrom[0])/self.zoom
+            self.panY += (e.y()-self.panFrom[1])/self.zoom
+            self.panFrom = e.x(), e.y()
+            self.redraw()
+            return
+        if self.mode == self.Mode.AddPoint:
+            if e.modifiers() & Qt.Modifier.CTRL:
+                x, y = self.view().toWorld(e.x(), e.y())
+                self.addPoint(round(x), round(y),
+                              computeImmediatly=False)
+        self.curX = e.x()
+        self.curY = e.y()
+        self.mUpdate(e.x(), e.y())
+
+    def mouseReleaseEvent(self, e):
+        self.panFrom = None
+        self.last_x = None
+        self.last_y = None
+
+    def wheelEvent(self, e: QWheelEvent):
+        ''' Zoom around the mouse '''
+        x, y = self.view().toWorld(e.pos().x(), e.pos().y())
+        self.zoom *= ZOOM_STEP**(e.angleDelta().y()/120)
+        self.panX = x-e.pos().x()/self.zoom
+        self.panY = y-(self.height()-e.pos().y())/self.zoom
+        self.redraw()
+
+
+COLORS = [
+    # 17 undertones https://lospec.com/palette-list/17undertones
+    '#000000', '#141923', '#414168', '#3a7fa7', '#35e3e3', '#8fd970', '#5ebb49',
+    '#458352', '#dcd37b', '#fffee5', '#ffd035', '#cc9245', '#a15c3e', '#a42f3b',
+    '#f45b7a', '#c24998', '#81588d', '#bcb0c2', '#ffffff',
+]
+
+
+class QPaletteButton(QPushButton):
+
+    def __init__(self, color):
+        super().__init__()
+        self.color = color
+
+        self.setFixedSize(QSize(32, 32))
+        self.setStyleSheet(
+            "background-color: %s; border-style: solid;  border-width:1px;  border-radius:50px;" % color)
+        self.setMask(QRegion(QRect(0, 0, 28, 28), QRegion.Ellipse))
+
+
+class MainWindow(QMainWindow):
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Voronoi")
+        # self.resize(WIN_SIZE, WIN_SIZE)
+        # self.mode = self.Mode.FreeDraw
+
+        # Menu ------------------------------------------------
+
+        menuBar = self.menuBar()
+        # Creating menus using a title
+        # fileMenu = menuBar.addMenu("&File")
+        insertMenu = menuBar.addMenu("&Edit")
+        # helpMenu = menuBar.addMenu("&Help")
+
+        insertFreeDrawAction = QAction("&Free Draw", self)
+        insertFreeDrawAction.triggered.connect(
+            lambda: self.canvas.setMode(Canvas.Mode.FreeDraw))
+        insertMenu.addAction(insertFreeDrawAction)
+
+        insertCircleAction = QAction("&Circle", self)
+        insertCircleAction.triggered.connect(self.insertCircle)
+        insertMenu.addAction(insertCircleAction)
+
+        insertRectAction = QAction("&Rectangle", self)
+        insertRectAction.triggered.connect(self.insertRectangle)
+        insertMenu.addAction(insertRectAction)
+
+        insertCropAction = QAction("&Crop", self)
+        insertCropAction.triggered.connect(
+            lambda: self.canvas.setMode(Canvas.Mode.Crop))
+        insertMenu.addAction(insertCropAction)
+
+        # UI --------------------------------------------------
+
+        self.canvas = Canvas()
+
+        paletteLayout = QHBoxLayout()
+        paletteLayout.addWidget(QWidget(), 1)
+        self.add_palette_buttons(paletteLayout)
+        paletteLayout.addWidget(QWidget(), 1)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas, 1)
+        layout.addLayout(paletteLayout)
+
+        mainWidget = QWidget()
+        mainWidget.setLayout(layout)
+        self.setCentralWidget(mainWidget)
+
+    # def drawInitPoints(self, points):
+    #     self.canvas.drawInitPoints(points)
+
+    def add_palette_buttons(self, layout):
+        for c in COLORS:
+            b = QPaletteButton(c)
+            b.pressed.connect(lambda c=c: self.canvas.set_pen_color(c))
+            layout.addWidget(b)
+
+    def insertCircle(self, event):
+        # print('insertCircle')
+        self.canvas.setMode(Canvas.Mode.InsertCircle)
+        # self.mode = self.Mode.InsertCircle
+
+    def insertRectangle(self, event):
+        # print('insertRectangle')
+        self.canvas.setMode(Canvas.Mode.InsertRectangle)
+        # self.mode = self.Mode.InsertRectangle
+
+
+class WorkerThread(QThread):
+    canvasUpdate = pyqtSignal()
+    clearCanvas = pyqtSignal()
+    drawPoints = pyqtSignal(list)
+    drawPolygon = pyqtSignal(list, QColor)
+    drawVoronoiOrEdges = pyqtSignal(object, QColor, int)
+    drawEdge = pyqtSignal(object, QColor, int, object)
+
+    def __init__(self, canvas: Canvas):
+        super(WorkerThread, self).__init__()
+        self.num = 0
+        self.polygons = []
+        self.canvas = canvas
+        self.firstDraw = True
+        self.voronoiResult = None
+        # The points voronoiResult is made of, in the order of Canvas.polygons.
+        # None if voronoiResult cannot be updated incrementally
+        self.resultPolygons = None
+        self.observer = CanvasObserver(self)
+
+    def run(self, *args, **kwargs):
+        if len(sys.argv) > 1:
+            try:
+                with open(sys.argv[1], 'rb') as f:
+                    if f.read(len(voronoi.BINARY_MAGIC)) == voronoi.BINARY_MAGIC:
+                        self.voronoiResult = CompactVoronoi.load(sys.argv[1]).toVoronoi()
+                        self.drawVoronoiOrEdges.emit(
+                            self.voronoiResult, GRAY, 4)
+                        return
+                    f.seek(0)
+                    first = f.read(1)
+                    if first in (b'P', b'C'):
+                        f.seek(0)
+                        # The first result of a batch output
+                        sites, edgeArray = readResult(f, case=0 if first == b'C' else None)
+                        p = [Voronoi.Polygon(x, y) for x, y in sites.tolist()]
+                        edges = []
+                        for x1, y1, x2, y2 in edgeArray.tolist():
+                            e = Voronoi.Edge()
+                            e.startVertex = Point(x1, y1)
+                            e.endVertex = Point(x2, y2)
+                            edges.append(e)
+                        self.voronoiResult = Voronoi(p, edges)
+                        self.drawVoronoiOrEdges.emit(
+                            self.voronoiResult, GRAY, 4)
+                        return
+                    else:
+                        f.seek(0)
+                        for points in readCases(f):
+                            self.polygons = [Voronoi.Polygon(x, y) for x, y in points.tolist()]
+                            if voronoi.DEBUG:
+                                print(
+                                    '\nn =', len(points), '---------------------------------------------------------')
+                                print(self.polygons)
+                            if self.firstDraw:
+                                self.firstDraw = False
+                            else:
+                                self.canvas.waitNext()
+                            self.voronoi(self.polygons)
+            except Exception as e:
+                print(traceback.format_exc())
+                pass
+            self.canvas.polygons = self.polygons
+        while True:
+            self.canvas.setMode(Canvas.Mode.AddPoint)
+            self.canvas.waitNext()
+            self.polygons = self.canvas.polygons.copy()
+            n = len(self.polygons)
+            if voronoi.DEBUG:
+                print(
+                    '\nn =', n, '---------------------------------------------------------')
+                print(self.polygons)
+            if not self.voronoiIncremental(self.polygons):
+                self.voronoi(self.polygons)
+
+    def voronoi(self, P: List[Voronoi.Polygon]) -> Voronoi:
+        ''' Wrapper function '''
+
+        if P is None or len(P) <= 0:
+            return
+
+        self.clearCanvas.emit()
+        self.drawPoints.emit(self.polygons)
+        self.resultPolygons = None
+        try:
+            self.voronoiResult = compute(P, None if self.canvas.isFastForward() else self.observer)
+            if len(self.voronoiResult.P) == len(P):  # No duplicates
+                self.resultPolygons = P
+            if self.canvas.isFastForward():
+                # The observer drew nothing, paint the result once
+                self.clearCanvas.emit()
+                self.drawPoints.emit(self.polygons)
+                self.drawVoronoiOrEdges.emit(self.voronoiResult, GRAY, 4)
+                self.canvasUpdate.emit()
+        except Exception as e:
+            print(traceback.format_exc())
+            self.canvas.waitStep()
+
+    def voronoiIncremental(self, P: List[Voronoi.Polygon]) -> bool:
+        '''
+        Update voronoiResult with Voronoi.insert() and remove()
+        when only a few points at the end of the list are added or removed, no step by step.
+
+        return False if the whole diagram has to be computed again
+        '''
+        oldP = self.resultPolygons
+        if self.voronoiResult is None or oldP is None or len(P) <= 0:
+            return False
+        nSame = 0
+        while nSame < len(oldP) and nSame < len(P) and oldP[nSame] is P[nSame]:
+            nSame += 1
+        if len(oldP)-nSame + len(P)-nSame > MAX_INCREMENTAL_POINTS:
+            return False
+
+        # The Canvas does not see the diagram while it changes, a redraw in between would index it half done
+        v = self.voronoiResult
+        self.voronoiResult = None
+        self.resultPolygons = None
+        try:
+            for p in reversed(oldP[nSame:]):
+                v.remove(p)
+            for p in P[nSame:]:
+                if v.insert(p) is not p:
+                    return False  # A duplicate
+        except Exception:
+            print(traceback.format_exc())
+            return False
+        self.voronoiResult = v
+        self.resultPolygons = P
+
+        self.clearCanvas.emit()
+        self.drawVoronoiOrEdges.emit(self.voronoiResult, GRAY, 4)
+        self.canvasUpdate.emit()
+        return True
+
+
+class CanvasObserver(MergeObserver):
+    '''
+    Draws every merge step on the Canvas and waits for the user between steps.
+    Does nothing once M is pressed in the middle of a merge, see Canvas.isFastForward()
+    '''
+
+    def __init__(self, workerThread: WorkerThread):
+        self.workerThread = workerThread
+
+    def crossEdges(self, vL, vR, crossEdgeTop, crossEdgeBottom):
+        w = self.workerThread
+        if w.canvas.isFastForward():
+            return
+        w.canvas.waitStep()
+        w.clearCanvas.emit()
+        w.drawEdge.emit(crossEdgeBottom, PURPLE, 4, Qt.PenStyle.DotLine)
+        w.drawEdge.emit(crossEdgeTop, RED, 4, Qt.PenStyle.DotLine)
+        w.drawPoints.emit(w.polygons)
+        w.drawVoronoiOrEdges.emit(vL, BLUE, 4)
+        w.drawVoronoiOrEdges.emit(vR, PURPLE, 4)
+        # w.drawPolygon.emit(ch, BLUE)
+        w.canvas.waitStep()
+
+    def hyperplaneStep(self, vL, vR, HP, crossEdgeTop, crossEdgeBottom, leftPolygonEdges, rightPolygonEdges):
+        w = self.workerThread
+        if w.canvas.isFastForward():
+            return
+        w.clearCanvas.emit()
+        w.drawEdge.emit(crossEdgeBottom, PURPLE,
+                        4, Qt.PenStyle.DotLine)
+        w.drawEdge.emit(crossEdgeTop, RED, 4, Qt.PenStyle.DotLine)
+        w.drawPoints.emit(w.polygons)
+        w.drawVoronoiOrEdges.emit(vL, BLUE, 4)
+        w.drawVoronoiOrEdges.emit(vR, PURPLE, 4)
+        w.drawVoronoiOrEdges.emit(HP, RED, 4)
+        w.drawVoronoiOrEdges.emit(leftPolygonEdges, GREEN, 8)
+        w.drawVoronoiOrEdges.emit(rightPolygonEdges, LIGHT_GREEN, 4)
+
+    def intersection(self, intersection):
+        w = self.workerThread
+        if w.canvas.isFastForward():
+            return
+        w.drawPolygon.emit([intersection], RED)
+        w.canvas.waitStep()
+
+    def intersectionNotFound(self):
+        if voronoi.DEBUG:
+            self.workerThread.canvas.waitNext()
+
+    def hyperplaneDone(self, v):
+        w = self.workerThread
+        if w.canvas.isFastForward():
+            return
+        w.canvas.waitHP()
+        w.clearCanvas.emit()
+        w.drawPoints.emit(w.polygons)
+        w.drawVoronoiOrEdges.emit(v, GRAY, 4)
+
+    def edgesDeleted(self, v):
+        w = self.workerThread
+        if w.canvas.isFastForward():
+            return
+        w.canvas.waitStep()
+        w.clearCanvas.emit()
+        w.drawPoints.emit(w.polygons)
+        w.drawVoronoiOrEdges.emit(v, GRAY, 4)
+
+
+def main():
+    for argv in sys.argv:
+        if argv == '-debug':
+            voronoi.DEBUG = True
+            break
+    app = QApplication(sys.argv[:1])
+    window = MainWindow()
+    window.show()
+    app.exec_()
+
+
+if __name__ == '__main__':
+    main()